@@ -1,13 +1,21 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_file
-import cv2
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
 import numpy as np
-from deepface import DeepFace
 import base64
+import io
 import os
 import json
 import pandas as pd
 from datetime import datetime
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_core.models import get_registry, actions_from_env
+from face_core.backends import get_backend, is_supported
+from face_core.render import AnnotationRenderer, make_annotation, encode_spec
+from face_core.ingest import decode_image, UploadPersister
+from face_core.batch import iter_uploaded_images, map_bounded
+from face_core.writer import write_atomic
 
 app = Flask(__name__)
 
@@ -17,6 +25,22 @@ RESULT_FOLDER = 'static/results'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULT_FOLDER, exist_ok=True)
 
+# 预加载的检测模型（可通过环境变量 PRELOAD_ACTIONS 配置，例如 age,gender）
+PRELOAD_ACTIONS = actions_from_env()
+
+# 进程启动时在后台预加载并预热模型，避免首个请求冷启动
+model_registry = get_registry(PRELOAD_ACTIONS)
+model_registry.start()
+
+# 结果图片按需渲染：分析时只保存标注描述，第一次访问时才绘制和编码，渲染结果缓存在内存中
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', 64))
+RENDER_QUALITY = int(os.environ.get('RENDER_QUALITY', 90))
+result_renderer = AnnotationRenderer(RESULT_FOLDER, RENDER_CACHE_SIZE, default_quality=RENDER_QUALITY)
+
+# 上传的图片直接在内存中解码；原图是按需渲染的底图，分析成功后交给后台线程保存，不阻塞请求
+upload_persister = UploadPersister()
+UPLOAD_WAIT_TIMEOUT = float(os.environ.get('UPLOAD_WAIT_TIMEOUT', 10))
+
 # 可用的分析方案配置
 AVAILABLE_SOLUTIONS = {
     'DeepFace': {
@@ -26,6 +50,13 @@ AVAILABLE_SOLUTIONS = {
         'features': ['年龄预测', '性别识别', '情绪分析', '种族识别'],
         'model_info': 'VGG-Face/OpenCV backend'
     },
+    'OpenCV': {
+        'id': 'opencv',
+        'description': 'OpenCV Haar级联分类器进行人脸检测，只依赖OpenCV，启动快、延迟低，适合对速度要求高的场景。属性分析沿用DeepFace属性模型（仍需加载DeepFace），检测精度低于深度学习检测器。',
+        'package': 'opencv',
+        'features': ['人脸检测', '年龄预测', '性别识别', '情绪分析', '种族识别'],
+        'model_info': 'Haar Cascade/DeepFace attributes'
+    },
     'Face++': {
         'id': 'facepp',
         'description': 'Face++是旷视科技开发的商业级人脸分析API。具有高精度的人脸检测和属性分析能力，服务稳定，适合商业应用。支持更细致的人脸特征分析，包括年龄、性别、情绪等。',
@@ -76,6 +107,66 @@ RACE_TRANSLATIONS = {
     "indian": "印度人"
 }
 
+# 批量分析配置：多张图片在有界线程池中并行分析，同时在途的图片数有上限
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 1000))
+
+
+def get_actions(detection_options):
+    # 获取启用的检测选项
+    actions = [action for action in ('age', 'gender', 'emotion', 'race') if detection_options.get(action, False)]
+    if not actions:
+        raise ValueError('请至少选择一个检测选项')
+    return actions
+
+
+def get_solution(selected_solution):
+    # 获取当前选择的方案配置，方案后端在第一次被选中时才加载
+    solution_config = next(
+        (solution for solution in AVAILABLE_SOLUTIONS.values() if solution['id'] == selected_solution),
+        None
+    )
+
+    if not solution_config:
+        raise ValueError('无效的方案选择')
+    if not is_supported(solution_config['id']):
+        raise ValueError(f"暂不支持 {solution_config['package']} 方案")
+    return solution_config['id']
+
+
+def analyze_frame(frame, actions, solution):
+    # 使用选定的方案进行分析
+    analysis = get_backend(solution).analyze(frame, actions)
+
+    if not isinstance(analysis, list):
+        analysis = [analysis]
+
+    # 处理结果并记录标注
+    results, annotations = [], []
+    for idx, face in enumerate(analysis):
+        region = face.get('region', {})
+
+        # 性别判断决定框的颜色
+        gender_dict = face.get('gender', {})
+        male_prob = gender_dict.get('Man', 0)
+        female_prob = gender_dict.get('Woman', 0)
+
+        color = (255, 0, 0) if abs(male_prob - female_prob) <= 20 else (0, 255, 0)
+
+        # 人脸框和序号在访问结果图片时再绘制
+        annotations.append(make_annotation(idx, region, color))
+
+        # 整理结果数据
+        result = {
+            'id': idx + 1,
+            'gender': "未知" if abs(male_prob - female_prob) <= 20 else ("男性" if male_prob > female_prob else "女性"),
+            'age': face.get('age', '未知'),
+            'emotion': EMOTION_TRANSLATIONS.get(face.get('dominant_emotion', '').lower(), '未知'),
+            'race': RACE_TRANSLATIONS.get(face.get('dominant_race', '').lower(), '未知')
+        }
+        results.append(result)
+    return results, annotations
+
 @app.route('/')
 def index():
     return render_template('index.html', solutions=AVAILABLE_SOLUTIONS)
@@ -89,7 +180,7 @@ def analyze():
             raise ValueError("未上传图片")
 
         # 获取分析方案和检测选项
-        selected_solution = request.form.get('solution', 'deepface')
+        solution = get_solution(request.form.get('solution', 'deepface'))
         detection_options = json.loads(request.form.get('detection_options', '{}'))
 
         # 保存上传的文件
@@ -99,81 +190,19 @@ def analyze():
         csv_filename = f"analysis_{timestamp}.csv"
 
         file_path = os.path.join(UPLOAD_FOLDER, original_filename)
-        file.save(file_path)
 
-        # 读取图像并转换颜色空间
-        frame = cv2.imread(file_path)
+        # 在内存中解码（各方案后端均接收 BGR 图像），不再先写盘再读回
+        image_bytes = file.read()
+        frame = decode_image(image_bytes)
         if frame is None:
             raise ValueError("无法读取图片")
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # 获取启用的检测选项
-        actions = []
-        if detection_options.get('age', False):
-            actions.append('age')
-        if detection_options.get('gender', False):
-            actions.append('gender')
-        if detection_options.get('emotion', False):
-            actions.append('emotion')
-        if detection_options.get('race', False):
-            actions.append('race')
-
-        if not actions:
-            raise ValueError('请至少选择一个检测选项')
-
-        # 获取当前选择的方案配置
-        solution_config = next(
-            (solution for solution in AVAILABLE_SOLUTIONS.values() if solution['id'] == selected_solution),
-            None
-        )
 
-        if not solution_config:
-            raise ValueError('无效的方案选择')
-
-        # 使用选定的方案进行分析
-        if solution_config['package'] == 'deepface':
-            analysis = DeepFace.analyze(
-                img_path=rgb_frame,
-                actions=actions,
-                enforce_detection=False,
-                detector_backend='opencv'
-            )
-        else:
-            raise ValueError(f"暂不支持 {solution_config['package']} 方案")
-
-        if not isinstance(analysis, list):
-            analysis = [analysis]
-
-        # 处理结果并绘制标注
-        results = []
-        for idx, face in enumerate(analysis):
-            region = face.get('region', {})
-            x, y, w, h = region.get('x', 0), region.get('y', 0), region.get('w', 0), region.get('h', 0)
-
-            # 性别判断决定框的颜色
-            gender_dict = face.get('gender', {})
-            male_prob = gender_dict.get('Man', 0)
-            female_prob = gender_dict.get('Woman', 0)
-
-            color = (255, 0, 0) if abs(male_prob - female_prob) <= 20 else (0, 255, 0)
-
-            # 绘制人脸框和序号
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            cv2.putText(frame, f"#{idx + 1}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-            # 整理结果数据
-            result = {
-                'id': idx + 1,
-                'gender': "未知" if abs(male_prob - female_prob) <= 20 else ("男性" if male_prob > female_prob else "女性"),
-                'age': face.get('age', '未知'),
-                'emotion': EMOTION_TRANSLATIONS.get(face.get('dominant_emotion', '').lower(), '未知'),
-                'race': RACE_TRANSLATIONS.get(face.get('dominant_race', '').lower(), '未知')
-            }
-            results.append(result)
-
-        # 保存结果图片
-        result_path = os.path.join(RESULT_FOLDER, result_filename)
-        cv2.imwrite(result_path, frame)
+        actions = get_actions(detection_options)
+        results, annotations = analyze_frame(frame, actions, solution)
+
+        # 分析成功后才保存原图（后台写入）和标注描述，结果图片按需渲染
+        upload_persister.save(image_bytes, file_path)
+        write_atomic(result_renderer.spec_path(result_filename), encode_spec(file_path, annotations))
 
         # 保存分析结果到CSV
         df = pd.DataFrame(results)
@@ -190,12 +219,78 @@ def analyze():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    # 多张图片（字段 images）或 ZIP 压缩包（字段 archive），返回各图片的结果和一份汇总 CSV
+    try:
+        solution = get_solution(request.form.get('solution', 'deepface'))
+        actions = get_actions(json.loads(request.form.get('detection_options', '{}')))
+
+        images = iter_uploaded_images(
+            request.files.getlist('images'),
+            request.files.get('archive'),
+            max_items=BATCH_MAX_IMAGES
+        )
+
+        def process(item):
+            # 单张图片失败（无法解码、检测或推理出错）只记在该条结果中，不影响整批
+            name, data = item
+            frame = decode_image(data)
+            if frame is None:
+                return {'file': name, 'status': 'error', 'message': '无法读取图片', 'results': []}
+            try:
+                results = analyze_frame(frame, actions, solution)[0]
+            except Exception as e:
+                return {'file': name, 'status': 'error', 'message': str(e), 'results': []}
+            return {'file': name, 'status': 'success', 'results': results}
+
+        items = list(map_bounded(process, images, BATCH_WORKERS))
+        if not items:
+            raise ValueError('未上传图片')
+
+        # 汇总 CSV：每张人脸一行，并注明来源文件
+        rows = [dict(result, file=item['file']) for item in items for result in item['results']]
+        csv_filename = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv"
+        df = pd.DataFrame(rows, columns=['file', 'id', 'gender', 'age', 'emotion', 'race'])
+        df.to_csv(os.path.join(RESULT_FOLDER, csv_filename), index=False, encoding='utf-8-sig')
+
+        return jsonify({
+            'status': 'success',
+            'total': len(items),
+            'failed': sum(1 for item in items if item['status'] != 'success'),
+            'items': items,
+            'csv_file': f'/static/results/{csv_filename}'
+        })
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/health')
+def health():
+    # 模型预热完成前返回 503，供负载均衡判断实例是否就绪
+    info = model_registry.health()
+    return jsonify(info), (200 if info['ready'] else 503)
+
+def serve_result(filename, as_attachment=False):
+    # 有标注描述的结果图片按需渲染（可用 size、quality 参数控制尺寸和质量），其余文件直接返回
+    if result_renderer.has_spec(filename):
+        # 原图可能仍在后台保存，渲染时最多等待 UPLOAD_WAIT_TIMEOUT 秒
+        data = result_renderer.render(
+            filename, request.args.get('size', type=int), request.args.get('quality', type=int),
+            UPLOAD_WAIT_TIMEOUT
+        )
+        if data is not None:
+            return send_file(io.BytesIO(data), mimetype='image/jpeg',
+                             as_attachment=as_attachment, download_name=filename)
+    return send_from_directory(RESULT_FOLDER, filename, as_attachment=as_attachment)
+
+@app.route('/static/results/<path:filename>')
+def result_file(filename):
+    return serve_result(filename)
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
-    return send_file(
-        os.path.join(RESULT_FOLDER, filename),
-        as_attachment=True
-    )
+    return serve_result(filename, as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,19 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import cv2
-import numpy as np
-from deepface import DeepFace
+from flask import Blueprint, Flask, Response, after_this_request, render_template, request, jsonify, \
+    send_file, send_from_directory
+import io
 import os
+import sys
 import json
-import pandas as pd
-from datetime import datetime, timedelta
-from celery import Celery
+import time
+import threading
+from datetime import timedelta
 import logging
-from logging.handlers import TimedRotatingFileHandler
-import redis
 from functools import wraps
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import safe_join
 
-# 初始化 Flask 应用
-app = Flask(__name__)
+# 重量级依赖（cv2、DeepFace/TensorFlow、Celery、Redis）推迟到真正用到它们的代码路径中再导入，
+# 只需要 Config 的命令行工具和 Web 进程启动都不再承担这些开销
+# 各模块的导入耗时可在本目录下用 PYTHONPATH=.. python -m face_core.import_budget app 查看
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_core.batch import iter_uploaded_images
+from face_core.writer import get_writer
+from face_core.storage import new_key, entry
+from face_core.metrics import registry as metrics_registry, trace, current_trace, span, observe
+from face_core.events import TERMINAL_STATES, format_sse
+from face_core.logqueue import BatchedTimedRotatingFileHandler, JsonFormatter, setup_queue_logging, \
+    bind_context, reset_context
+
+bp = Blueprint('main', __name__)
 
 
 # 基础配置
@@ -24,8 +35,14 @@ class Config:
     UPLOAD_FOLDER = 'static/uploads'
     RESULT_FOLDER = 'static/results'
     LOG_FOLDER = 'logs'
+    METRICS_FOLDER = 'metrics'  # 各进程的指标快照，/metrics 合并输出
+    DATA_FOLDER = 'data'
+    ARTIFACT_INDEX = os.path.join(DATA_FOLDER, 'artifacts.db')  # 上传和结果文件的过期索引
+    RESULTS_DB = os.path.join(DATA_FOLDER, 'results.db')  # 每张人脸一行的结果库，供 /stats 统计
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB 限制
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    BATCH_MAX_IMAGES = 1000  # 单个批量任务最多处理的图片数
+    BATCH_MAX_CONTENT_LENGTH = 512 * 1024 * 1024  # 批量接口单独的请求体上限（512MB）
 
     # 模型配置
     MODEL_PATHS = {
@@ -36,6 +53,13 @@ class Config:
             'features': ['年龄预测', '性别识别', '情绪分析', '种族识别'],
             'model_info': 'VGG-Face/OpenCV backend'
         },
+        'OpenCV': {
+            'id': 'opencv',
+            'name': 'OpenCV',
+            'description': 'OpenCV Haar级联人脸检测，启动快、延迟低，属性分析沿用DeepFace属性模型。',
+            'features': ['人脸检测', '年龄预测', '性别识别', '情绪分析', '种族识别'],
+            'model_info': 'Haar Cascade'
+        },
         'Face++': {
             'id': 'facepp',
             'name': 'Face++',
@@ -66,6 +90,45 @@ class Config:
         }
     }
 
+    # Celery 工作进程启动时预加载的检测模型（环境变量 PRELOAD_ACTIONS，例如 age,gender）
+    PRELOAD_ACTIONS = [a.strip() for a in os.environ.get('PRELOAD_ACTIONS', 'age,gender,emotion,race').split(',')
+                       if a.strip()]
+
+    # 人脸检测输入的最长边上限，超过时缩小后检测，人脸仍从原图裁剪（0 表示不缩放）
+    MAX_DETECT_SIDE = int(os.environ.get('MAX_DETECT_SIDE', 1280))
+
+    # 上传和结果文件以 ULID 命名，按日期分区和散列子目录保存（<目录>/YYYY/MM/DD/<两位>/）
+    # 保留 ARTIFACT_RETENTION_HOURS 小时
+    # 清理任务每 CLEANUP_INTERVAL 秒运行一次（Celery beat），每批删除 CLEANUP_BATCH_SIZE 个文件，每秒最多删除 CLEANUP_MAX_RATE 个
+    ARTIFACT_RETENTION_HOURS = 24
+    CLEANUP_INTERVAL = 600
+    CLEANUP_BATCH_SIZE = 500
+    CLEANUP_MAX_RATE = 2000
+
+    # 任务进度写入 Redis 的最小间隔（秒）
+    PROGRESS_MIN_INTERVAL = 1.0
+
+    # 任务队列：celery 使用 Celery + Redis；local 在 Web 进程内用线程池执行，不需要 Redis
+    TASK_BACKEND = os.environ.get('TASK_BACKEND', 'celery')
+    LOCAL_TASK_WORKERS = int(os.environ.get('LOCAL_TASK_WORKERS', 2))
+
+    # 任务事件总线：redis 经 Redis pub/sub 跨进程推送，local 只在本进程内推送（任务与 Web 同进程时）
+    EVENT_BUS = os.environ.get('EVENT_BUS', 'redis' if TASK_BACKEND == 'celery' else 'local')
+    # SSE 连接空闲时发送心跳的间隔（秒），避免被代理断开
+    SSE_KEEPALIVE = 15
+
+    # 结果文件由工作进程后台写入，访问时最多等待的秒数
+    ARTIFACT_WAIT_TIMEOUT = 10
+
+    # 日志先进入队列，由监听线程批量写入；队列空闲超过该秒数时落盘，队列满时丢弃新日志
+    LOG_FLUSH_INTERVAL = 1.0
+    LOG_QUEUE_SIZE = 10000
+
+    # 结果图片按需渲染的缓存条数、总字节数上限和默认 JPEG 质量
+    RENDER_CACHE_SIZE = 64
+    RENDER_CACHE_BYTES = 64 * 1024 * 1024
+    RENDER_QUALITY = 90
+
     # Redis 配置（用于任务队列）
     REDIS_URL = 'redis://localhost:6379/0'
 
@@ -74,44 +137,33 @@ class Config:
     CELERY_RESULT_BACKEND = REDIS_URL
 
 
-app.config.from_object(Config)
-
-# 创建必要的文件夹
-for folder in [Config.UPLOAD_FOLDER, Config.RESULT_FOLDER, Config.LOG_FOLDER]:
-    os.makedirs(folder, exist_ok=True)
-
-# 初始化 Celery
-celery = Celery(app.name, broker=app.config['CELERY_BROKER_URL'])
-celery.conf.update(app.config)
+logger = logging.getLogger('face_analysis')
 
-# 初始化 Redis
-redis_client = redis.from_url(Config.REDIS_URL)
+# 请求总耗时，按操作类型和结果区分；各阶段耗时见 face_stage_duration_seconds
+REQUEST_SECONDS = metrics_registry.histogram(
+    'face_request_duration_seconds', '接口请求耗时（秒）', ('operation', 'status')
+)
 
 
-# 配置日志
+# 配置日志：请求线程只把记录放进队列，JSON 格式化和写文件在监听线程中完成
 def setup_logger():
+    if logger.handlers:
+        return logger
+
+    os.makedirs(Config.LOG_FOLDER, exist_ok=True)
     log_file = os.path.join(Config.LOG_FOLDER, 'app.log')
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - '
-        '[%(filename)s:%(lineno)d] - %(message)s'
-    )
 
-    file_handler = TimedRotatingFileHandler(
+    file_handler = BatchedTimedRotatingFileHandler(
         log_file, when='midnight', interval=1,
         backupCount=30, encoding='utf-8'
     )
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(JsonFormatter())
 
-    logger = logging.getLogger('face_analysis')
-    logger.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
+    setup_queue_logging(logger, [file_handler], logging.INFO, Config.LOG_FLUSH_INTERVAL, Config.LOG_QUEUE_SIZE)
 
     return logger
 
 
-logger = setup_logger()
-
-
 # 自定义异常类
 class AnalysisError(Exception):
     pass
@@ -140,110 +192,314 @@ def validate_file(file):
 
 
 def log_operation(operation_type):
+    # 每个请求开启一个 trace（沿用请求头 X-Trace-Id 或新建），响应头返回 trace_id，耗时记入指标
+    # IP、UA 等请求信息在这里读取一次作为日志上下文，本请求内的所有日志都带上这些字段
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            start_time = datetime.now()
-            request_ip = request.remote_addr
-            user_agent = request.user_agent.string
-
-            logger.info(
-                f"Operation started: {operation_type} - "
-                f"IP: {request_ip} - UA: {user_agent}"
+            start_time = time.perf_counter()
+            token = bind_context(
+                operation=operation_type, ip=request.remote_addr,
+                method=request.method, path=request.path, user_agent=request.user_agent.string
             )
 
             try:
-                result = f(*args, **kwargs)
-                logger.info(
-                    f"Operation completed: {operation_type} - "
-                    f"IP: {request_ip} - "
-                    f"Duration: {datetime.now() - start_time}"
-                )
-                return result
-            except Exception as e:
-                logger.error(
-                    f"Operation failed: {operation_type} - "
-                    f"IP: {request_ip} - Error: {str(e)}"
-                )
-                raise
+                with trace(request.headers.get('X-Trace-Id')) as current:
+                    logger.info("Operation started")
+
+                    @after_this_request
+                    def add_trace_header(response):
+                        response.headers['X-Trace-Id'] = current.trace_id
+                        return response
+
+                    try:
+                        result = f(*args, **kwargs)
+                    except Exception as e:
+                        REQUEST_SECONDS.observe(time.perf_counter() - start_time, operation=operation_type,
+                                                status='error')
+                        logger.error(f"Operation failed: {str(e)}")
+                        raise
+
+                    duration = time.perf_counter() - start_time
+                    REQUEST_SECONDS.observe(duration, operation=operation_type, status='ok')
+                    logger.info("Operation completed", extra={'fields': {
+                        'duration_ms': round(duration * 1000, 1), 'spans': current.spans
+                    }})
+                    return result
+            finally:
+                reset_context(token)
 
         return decorated_function
 
     return decorator
 
 
-# Celery 任务
-@celery.task(bind=True)
+# Celery 工作进程启动时加载模型，任务执行时不再承担冷启动开销
+def preload_models(**kwargs):
+    from face_core.models import get_registry
+
+    registry = get_registry(Config.PRELOAD_ACTIONS)
+    registry.start(background=False)
+    if registry.is_ready():
+        logger.info(f"Models preloaded in worker {registry.pid}: {registry.load_seconds}s")
+    else:
+        logger.error(f"Model preload failed in worker {registry.pid}: {registry.error}")
+
+
+def flush_worker_process(**kwargs):
+    # prefork 子进程被回收时经 os._exit 退出，atexit 不会执行；退出前写完后台队列中的结果文件、结果库记录和指标快照
+    get_writer().flush()
+    if _results_store is not None:
+        _results_store.flush()
+    metrics_registry.dump(Config.METRICS_FOLDER, min_interval=0)
+
+
+def publish_task_event(task_id, event):
+    # 推送失败不影响任务本身，客户端连接时会再查询一次任务状态
+    try:
+        get_event_bus().publish(task_id, event)
+    except Exception as e:
+        logger.warning(f"Task event publish failed: {str(e)}")
+
+
+class ProgressReporter:
+    """节流的任务进度上报：距上次写入不足 min_interval 秒的进度直接丢弃，最终进度并入任务结果"""
+
+    def __init__(self, task, min_interval=Config.PROGRESS_MIN_INTERVAL):
+        self.task = task
+        self.min_interval = min_interval
+        self.last_report = time.monotonic()
+        self.progress = 0
+
+    def report(self, progress):
+        self.progress = progress
+        now = time.monotonic()
+        if now - self.last_report >= self.min_interval:
+            self.task.update_state(state='PROGRESS', meta={'progress': progress})
+            publish_task_event(self.task.request.id, {'state': 'PROGRESS', 'progress': progress})
+            self.last_report = now
+
+
+# 由 traced_task 包装的任务名，完成后推送结果
+TRACED_TASKS = set()
+
+
+def traced_task(f):
+    """任务在提交方传入的 trace_id 下执行，各阶段耗时随结果返回，并在结束时立即写入本进程的指标快照"""
+    TRACED_TASKS.add(f'app.{f.__name__}')
+
+    @wraps(f)
+    def wrapper(self, *args, trace_id=None, **kwargs):
+        token = bind_context(task=f.__name__, task_id=self.request.id)
+        try:
+            with trace(trace_id) as current:
+                with span(f.__name__):
+                    result = f(self, *args, **kwargs)
+                result['trace_id'] = current.trace_id
+                result['spans'] = current.spans
+                logger.info("Task finished", extra={'fields': {'spans': current.spans}})
+        finally:
+            reset_context(token)
+            # 任务结束时不受节流限制，/metrics 能立即看到本次任务的耗时
+            metrics_registry.dump(Config.METRICS_FOLDER, min_interval=0)
+        return result
+
+    return wrapper
+
+
+def publish_task_result(task_name, task_id, state, info):
+    """
+    任务结果保存到任务后端之后才推送（Celery 的 task_success / task_failure 信号，本地队列的 on_finish），
+    客户端收到事件后再查询任务状态也能得到同样的结果
+    """
+    if task_name not in TRACED_TASKS:
+        return
+    if state == 'SUCCESS':
+        publish_task_event(task_id, {'state': 'SUCCESS', 'progress': 100, 'result': info})
+    else:
+        # 任务意外失败时也通知等待中的客户端，避免连接一直挂起
+        publish_task_event(task_id, {'state': 'FAILURE', 'progress': 0, 'message': str(info)})
+
+
+def observe_write(path, seconds):
+    # 后台写入线程回调：按文件类型记录写入耗时
+    stage = {'.csv': 'csv_write', '.json': 'spec_write'}.get(os.path.splitext(path)[1], 'image_write')
+    observe(stage, seconds)
+
+
+def infer_attributes(backend, detections, actions):
+    # 逐个属性模型推理，分别计时
+    attributes = [{} for _ in detections]
+    for action in actions:
+        with span(f'attr_{action}'):
+            for attrs, result in zip(attributes, backend.attributes(detections, [action])):
+                attrs.update(result)
+    return attributes
+
+
+def register_artifacts(store, entries):
+    # 登记到产物索引，由清理任务按过期时间删除；登记失败不影响本次分析
+    try:
+        store.register(entries)
+    except Exception as e:
+        logger.warning(f"Artifact index error: {str(e)}")
+
+
+def parse_actions(options):
+    # 检测选项可以是 {"age": true} 形式的字典，也可以是 ["age", ...] 形式的列表
+    if isinstance(options, dict):
+        return [k for k, v in options.items() if v]
+    return list(options)
+
+
+def save_analysis(source_path, analysis, key, solution=None):
+    # 保存标注描述和 CSV，结果图片在第一次访问时才根据原图渲染
+    from face_core.render import make_annotation, encode_spec
+
+    results, annotations = [], []
+    for idx, face in enumerate(analysis):
+        # 处理人脸区域
+        annotations.append(make_annotation(idx, face.get('region', {}), (0, 255, 0), label=False))
+
+        # 整理结果
+        result = {
+            'id': idx + 1,
+            'gender': "男性" if face.get('gender', {}).get('Man', 0) > 50 else "女性",
+            'age': face.get('age', '未知'),
+            'emotion': face.get('dominant_emotion', '未知'),
+            'race': face.get('dominant_race', '未知')
+        }
+        results.append(result)
+
+    # 结果文件交给后台线程保存，任务直接返回；文件名为相对结果目录的路径（含日期分区和散列子目录）
+    store = get_store(Config.RESULT_FOLDER)
+    csv_path = store.path_for(key, f"analysis_{key}.csv")
+    result_image = store.relpath(os.path.join(os.path.dirname(csv_path), f"result_{key}.jpg"))
+    result_csv = store.relpath(csv_path)
+    spec_path = get_renderer().spec_path(result_image)
+    spec = encode_spec(source_path, annotations)
+
+    writer = get_writer()
+    writer.observer = observe_write
+    writer.write_bytes(spec_path, spec)
+    writer.write_csv(csv_path, results)
+    register_artifacts(store, [entry(spec_path, key, 'spec', spec), entry(csv_path, key, 'csv')])
+    # 每张人脸追加到结果库（后台批量写入）
+    get_results_store().append(results, key, os.path.basename(source_path), solution)
+
+    return {
+        'status': 'success',
+        'results': results,
+        'result_image': f'/static/results/{result_image}',
+        'csv_file': f'/static/results/{result_csv}'
+    }
+
+
+def save_batch_csv(items):
+    store = get_store(Config.RESULT_FOLDER)
+    key = new_key()
+    csv_path = store.path_for(key, f"batch_{key}.csv")
+    rows = [dict(result, file=item['file']) for item in items if item.get('status') == 'success'
+            for result in item['results']]
+    writer = get_writer()
+    writer.observer = observe_write
+    writer.write_csv(csv_path, rows, fieldnames=['file', 'id', 'gender', 'age', 'emotion', 'race'])
+    register_artifacts(store, [entry(csv_path, key, 'csv')])
+    return f'/static/results/{store.relpath(csv_path)}'
+
+
+# 任务（在 get_celery / get_local_queue 中注册）
+@traced_task
 def analyze_image_task(self, file_path, solution, options):
+    import cv2
+    from face_core.backends import get_backend
+    from face_core.pipeline import merge_results
+
     try:
-        frame = cv2.imread(file_path)
+        progress = ProgressReporter(self)
+        backend = get_backend(solution)
+
+        with span('decode'):
+            frame = cv2.imread(file_path)
         if frame is None:
             raise AnalysisError("无法读取图片")
 
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 第一阶段：检测人脸（每张图片只检测一次）
+        with span('detect'):
+            detections = backend.detect(frame, Config.MAX_DETECT_SIDE)
+        progress.report(30)
 
-        # 更新进度
-        self.update_state(state='PROGRESS', meta={'progress': 30})
+        # 第二阶段：只运行请求的属性模型
+        analysis = merge_results(detections, infer_attributes(backend, detections, parse_actions(options)))
+        progress.report(60)
 
-        # 分析图片
-        analysis = DeepFace.analyze(
-            img_path=rgb_frame,
-            actions=list(options.keys()),
-            enforce_detection=False,
-            detector_backend='opencv'
-        )
+        # 处理结果
+        with span('save'):
+            response = save_analysis(file_path, analysis, new_key(), solution)
 
-        if not isinstance(analysis, list):
-            analysis = [analysis]
+        # 最终进度随结果一起返回，不再单独写入 Redis
+        response['progress'] = 100
+        return response
 
-        # 处理结果
-        self.update_state(state='PROGRESS', meta={'progress': 60})
-
-        results = []
-        for idx, face in enumerate(analysis):
-            # 处理人脸区域
-            region = face.get('region', {})
-            x, y, w, h = region.get('x', 0), region.get('y', 0), \
-                region.get('w', 0), region.get('h', 0)
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-            # 整理结果
-            result = {
-                'id': idx + 1,
-                'gender': "男性" if face.get('gender', {}).get('Man', 0) > 50 else "女性",
-                'age': face.get('age', '未知'),
-                'emotion': face.get('dominant_emotion', '未知'),
-                'race': face.get('dominant_race', '未知')
-            }
-            results.append(result)
-
-        # 保存结果
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        result_image = f"result_{timestamp}.jpg"
-        result_csv = f"analysis_{timestamp}.csv"
-
-        cv2.imwrite(os.path.join(Config.RESULT_FOLDER, result_image), frame)
-        pd.DataFrame(results).to_csv(
-            os.path.join(Config.RESULT_FOLDER, result_csv),
-            index=False, encoding='utf-8-sig'
-        )
+    except Exception as e:
+        logger.error(f"Analysis task error: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
 
-        self.update_state(state='PROGRESS', meta={'progress': 100})
 
-        return {
-            'status': 'success',
-            'results': results,
-            'result_image': f'/static/results/{result_image}',
-            'csv_file': f'/static/results/{result_csv}'
-        }
+@traced_task
+def analyze_images_task(self, file_paths, solution, options, names=None):
+    """
+    批量任务：一个任务处理多张图片，所有人脸合并成一批做属性推理
+    names 为客户端上传的文件名（或压缩包内的路径），结果和汇总 CSV 中使用；汇总 CSV 每张人脸一行
+    """
+    import cv2
+    from face_core.backends import get_backend
+    from face_core.pipeline import merge_results
+
+    try:
+        progress = ProgressReporter(self)
+        actions = parse_actions(options)
+        backend = get_backend(solution)
+        names = names or [os.path.basename(path) for path in file_paths]
+
+        # 第一阶段：逐张检测；检测结果中已经裁好人脸，原图检测完即释放，不在整个任务期间保留
+        starts, detections, items = [], [], []
+        for i, file_path in enumerate(file_paths):
+            with span('decode'):
+                frame = cv2.imread(file_path)
+            if frame is None:
+                items.append({'status': 'error', 'message': "无法读取图片", 'file': names[i]})
+                continue
+            starts.append((i, len(detections)))
+            with span('detect'):
+                detections.extend(backend.detect(frame, Config.MAX_DETECT_SIDE))
+            del frame
+            items.append(None)
+            progress.report(int(50 * (i + 1) / len(file_paths)))
+
+        # 第二阶段：所有图片的人脸一次推理
+        analysis = merge_results(detections, infer_attributes(backend, detections, actions))
+        progress.report(80)
+
+        bounds = [start for _, start in starts[1:]] + [len(detections)]
+        for (i, start), end in zip(starts, bounds):
+            with span('save'):
+                items[i] = save_analysis(file_paths[i], analysis[start:end], new_key(), solution)
+            items[i]['file'] = names[i]
+
+        # 汇总 CSV：整批每张人脸一行，注明来源文件
+        with span('save'):
+            csv_file = save_batch_csv(items)
+
+        return {'status': 'success', 'items': items, 'csv_file': csv_file, 'progress': 100}
 
     except Exception as e:
-        logger.error(f"Analysis task error: {str(e)}")
+        logger.error(f"Batch analysis task error: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
 
 # 路由
-@app.route('/')
+@bp.route('/')
 def index():
     """主页路由"""
     return render_template(
@@ -252,7 +508,7 @@ def index():
     )
 
 
-@app.route('/analyze', methods=['POST'])
+@bp.route('/analyze', methods=['POST'])
 @log_operation('analyze_image')
 def analyze():
     try:
@@ -267,18 +523,23 @@ def analyze():
         if not options:
             raise ValueError("请至少选择一个检测选项")
 
-        # 保存文件
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"upload_{timestamp}.jpg"
-        file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(file_path)
+        # 保存文件：ULID 命名，同一秒内的并发请求不会互相覆盖
+        data = file.read()
+        with span('upload_save'):
+            store = get_store(Config.UPLOAD_FOLDER)
+            key = new_key()
+            item = store.write(key, f"upload_{key}.jpg", data, 'upload')
+        register_artifacts(store, [item])
+        file_path = item['path']
 
-        # 创建异步任务
-        task = analyze_image_task.delay(file_path, solution, options)
+        # 创建异步任务，trace_id 随任务传给 worker
+        trace_id = current_trace().trace_id
+        task = get_task('analyze_image_task').delay(file_path, solution, options, trace_id=trace_id)
 
         return jsonify({
             'status': 'success',
-            'task_id': task.id
+            'task_id': task.id,
+            'trace_id': trace_id
         })
 
     except FileValidationError as e:
@@ -290,9 +551,62 @@ def analyze():
         return jsonify({'status': 'error', 'message': "处理失败"}), 500
 
 
-@app.route('/task/<task_id>')
-def get_task_status(task_id):
-    task = analyze_image_task.AsyncResult(task_id)
+@bp.route('/analyze/batch', methods=['POST'])
+@log_operation('analyze_batch')
+def analyze_batch():
+    # 批量上传使用单独的请求体上限，不受单张图片接口 MAX_CONTENT_LENGTH 的限制（须在读取表单之前设置）
+    request.max_content_length = Config.BATCH_MAX_CONTENT_LENGTH
+    try:
+        # 获取参数
+        solution = request.form.get('solution', 'deepface')
+        options = json.loads(request.form.get('detection_options', '{}'))
+
+        if not options:
+            raise ValueError("请至少选择一个检测选项")
+
+        # 多张图片或 ZIP 压缩包，逐个写入上传目录，不整体解压
+        store = get_store(Config.UPLOAD_FOLDER)
+        items, names = [], []
+        with span('upload_save'):
+            for name, data in iter_uploaded_images(
+                    request.files.getlist('images'), request.files.get('archive'),
+                    Config.ALLOWED_EXTENSIONS, Config.BATCH_MAX_IMAGES):
+                ext = name.rsplit('.', 1)[1].lower()
+                key = new_key()
+                items.append(store.write(key, f"upload_{key}.{ext}", data, 'upload'))
+                names.append(name)
+
+        if not items:
+            raise FileValidationError("未上传文件")
+        # 整批图片在一个事务中登记
+        register_artifacts(store, items)
+        file_paths = [item['path'] for item in items]
+
+        # 一个任务处理整批图片
+        trace_id = current_trace().trace_id
+        task = get_task('analyze_images_task').delay(file_paths, solution, options, names, trace_id=trace_id)
+
+        return jsonify({
+            'status': 'success',
+            'task_id': task.id,
+            'trace_id': trace_id,
+            'total': len(file_paths)
+        })
+
+    except FileValidationError as e:
+        logger.warning(f"File validation error: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    except RequestEntityTooLarge:
+        return jsonify({'status': 'error', 'message': "上传内容过大"}), 413
+
+    except Exception as e:
+        logger.error(f"Batch analyze error: {str(e)}")
+        return jsonify({'status': 'error', 'message': "处理失败"}), 500
+
+
+def task_status(task_id):
+    task = get_task('analyze_image_task').AsyncResult(task_id)
 
     if task.state == 'PENDING':
         response = {
@@ -308,45 +622,307 @@ def get_task_status(task_id):
     else:
         response = {
             'state': task.state,
-            'progress': task.info.get('progress', 0) if task.info else 0,
+            'progress': task.info.get('progress', 0) if isinstance(task.info, dict) else 0,
         }
 
-    return jsonify(response)
+    return response
+
+
+@bp.route('/task/<task_id>')
+def get_task_status(task_id):
+    return jsonify(task_status(task_id))
+
+
+@bp.route('/task/<task_id>/events')
+def task_events(task_id):
+    """
+    SSE 推送任务进度和结果，任务完成后关闭连接
+    连接建立时先发送当前状态（优先取事件总线缓存的最近事件，否则查询一次任务状态），之后只等待推送
+    """
+    bus = get_event_bus()
+    # 先订阅再取当前状态，两者之间发布的事件不会丢失
+    subscription = bus.subscribe(task_id)
+    event = bus.last(task_id)
+    if event is None:
+        try:
+            event = task_status(task_id)
+        except Exception as e:
+            logger.warning(f"Task status lookup failed: {str(e)}")
+
+    def stream(event):
+        try:
+            while True:
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_sse(event)
+                    if event.get('state') in TERMINAL_STATES:
+                        return
+                event = subscription.get(Config.SSE_KEEPALIVE)
+                if event is None:
+                    # 心跳时再查询一次任务状态，推送丢失（如 Redis 重连期间）时也能结束连接
+                    try:
+                        status = task_status(task_id)
+                    except Exception as e:
+                        logger.warning(f"Task status lookup failed: {str(e)}")
+                    else:
+                        if status.get('state') in TERMINAL_STATES:
+                            event = status
+        finally:
+            subscription.close()
+
+    return Response(stream(event), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@bp.route('/stats')
+def stats():
+    # 在结果库中聚合，不读取各次分析的 CSV；参数见 face_core.results_store.stats_from_args
+    from face_core.results_store import stats_from_args
+
+    try:
+        with span('stats_query'):
+            data = stats_from_args(get_results_store(), request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(dict(data, status='success'))
+
+
+@bp.route('/metrics')
+def metrics():
+    # Prometheus 文本格式，合并本进程和各 worker 进程写入的指标快照
+    return Response(metrics_registry.render(Config.METRICS_FOLDER), mimetype='text/plain; version=0.0.4')
+
+
+def is_expected(path):
+    # 文件已落盘、本进程正在写入，或者已由工作进程登记到产物索引（可能仍在写入）
+    if os.path.exists(path) or get_writer().is_pending(path):
+        return True
+    try:
+        return get_artifact_index().contains(path)
+    except Exception as e:
+        logger.warning(f"Artifact index error: {str(e)}")
+        return False
+
+
+def serve_result(filename, as_attachment=False):
+    # 结果图片根据标注描述按需渲染（可用 size、quality 参数控制尺寸和质量），CSV 等文件直接返回
+    # 只等待已知会出现的文件（工作进程可能仍在后台写入），未知或跳出结果目录的文件名直接返回 404
+    path = safe_join(Config.RESULT_FOLDER, filename)
+    if path is None:
+        return jsonify({'status': 'error', 'message': '文件不存在'}), 404
+    if filename.lower().endswith('.jpg') and not os.path.exists(path):
+        result_renderer = get_renderer()
+        spec_path = result_renderer.spec_path(filename)
+        if is_expected(spec_path):
+            get_writer().wait(spec_path, Config.ARTIFACT_WAIT_TIMEOUT)
+            with span('render'):
+                data = result_renderer.render(
+                    filename, request.args.get('size', type=int), request.args.get('quality', type=int)
+                )
+            if data is None:
+                return jsonify({'status': 'error', 'message': '原图不存在，无法生成结果图片'}), 404
+            return send_file(io.BytesIO(data), mimetype='image/jpeg',
+                             as_attachment=as_attachment, download_name=filename)
+
+    if not is_expected(path) or not get_writer().wait(path, Config.ARTIFACT_WAIT_TIMEOUT):
+        return jsonify({'status': 'error', 'message': '文件不存在'}), 404
+    return send_from_directory(Config.RESULT_FOLDER, filename, as_attachment=as_attachment)
+
 
+@bp.route('/static/results/<path:filename>')
+def result_file(filename):
+    return serve_result(filename)
 
-@app.route('/download/<path:filename>')
+
+@bp.route('/download/<path:filename>')
 @log_operation('download_file')
 def download_file(filename):
     try:
-        return send_file(
-            os.path.join(Config.RESULT_FOLDER, filename),
-            as_attachment=True
-        )
+        return serve_result(filename, as_attachment=True)
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
         return jsonify({'status': 'error', 'message': "下载失败"}), 404
 
 
-# 清理任务
-@celery.task
+# 清理任务：按过期索引分批删除文件，再整体删除超过保留期的日期分区，不扫描全部文件
 def cleanup_old_files():
-    try:
-        threshold = datetime.now() - timedelta(hours=24)
-        cleaned = 0
+    from face_core.storage import ExpiryCleaner
 
-        for folder in [Config.UPLOAD_FOLDER, Config.RESULT_FOLDER]:
-            for filename in os.listdir(folder):
-                filepath = os.path.join(folder, filename)
-                if os.path.getctime(filepath) < threshold.timestamp():
-                    os.remove(filepath)
-                    cleaned += 1
-
-        logger.info(f"Cleaned {cleaned} old files")
+    try:
+        cleaner = ExpiryCleaner(
+            [Config.UPLOAD_FOLDER, Config.RESULT_FOLDER], get_artifact_index(),
+            timedelta(hours=Config.ARTIFACT_RETENTION_HOURS), Config.CLEANUP_BATCH_SIZE, Config.CLEANUP_MAX_RATE
+        )
+        stats = cleaner.run()
+        logger.info("Cleaned old files", extra={'fields': stats})
+        return stats
 
     except Exception as e:
         logger.error(f"Cleanup error: {str(e)}")
 
 
+_renderer = None
+_artifact_index = None
+_results_store = None
+_stores = {}
+_celery = None
+_local_queue = None
+_redis = None
+_event_bus = None
+_app = None
+
+
+def get_renderer():
+    """结果图片渲染器，第一次访问结果图片时才创建（会导入 cv2）"""
+    global _renderer
+    if _renderer is None:
+        from face_core.render import AnnotationRenderer
+        _renderer = AnnotationRenderer(
+            Config.RESULT_FOLDER, Config.RENDER_CACHE_SIZE, Config.RENDER_CACHE_BYTES, Config.RENDER_QUALITY
+        )
+    return _renderer
+
+
+def get_artifact_index():
+    global _artifact_index
+    if _artifact_index is None:
+        from face_core.storage import ArtifactIndex
+        _artifact_index = ArtifactIndex(Config.ARTIFACT_INDEX)
+    return _artifact_index
+
+
+def get_results_store():
+    global _results_store
+    if _results_store is None:
+        from face_core.results_store import ResultsStore
+        _results_store = ResultsStore(Config.RESULTS_DB)
+    return _results_store
+
+
+def get_store(root):
+    """上传目录、结果目录各一个产物存储，共用同一个索引"""
+    store = _stores.get(root)
+    if store is None:
+        from face_core.storage import ArtifactStore
+        store = _stores[root] = ArtifactStore(root, get_artifact_index(), Config.ARTIFACT_RETENTION_HOURS * 3600)
+    return store
+
+
+def get_celery():
+    """第一次使用时才导入 Celery 并注册任务：Web 进程在第一次提交任务时，worker 在启动时"""
+    global _celery
+    if _celery is None:
+        from celery import Celery
+        from celery.signals import task_failure, task_success, worker_process_init, worker_process_shutdown
+
+        setup_logger()
+        celery = Celery('app', broker=Config.CELERY_BROKER_URL)
+        celery.conf.update({key: getattr(Config, key) for key in dir(Config) if key.isupper()})
+
+        # 任务名固定为 app.*，无论本文件以何种方式导入，Web 进程和 worker 看到的任务名都一致
+        celery.task(bind=True, name='app.analyze_image_task')(analyze_image_task)
+        celery.task(bind=True, name='app.analyze_images_task')(analyze_images_task)
+        celery.task(name='app.cleanup_old_files')(cleanup_old_files)
+        # 由 celery -A app.celery beat 定时触发清理
+        celery.conf.beat_schedule = {
+            'cleanup-old-files': {'task': 'app.cleanup_old_files', 'schedule': Config.CLEANUP_INTERVAL}
+        }
+        worker_process_init.connect(preload_models, weak=False)
+        worker_process_shutdown.connect(flush_worker_process, weak=False)
+        # 信号在任务结果写入结果后端之后发出
+        task_success.connect(publish_celery_success, weak=False)
+        task_failure.connect(publish_celery_failure, weak=False)
+        _celery = celery
+    return _celery
+
+
+def publish_celery_success(sender=None, result=None, **kwargs):
+    publish_task_result(sender.name, sender.request.id, 'SUCCESS', result)
+
+
+def publish_celery_failure(sender=None, task_id=None, exception=None, **kwargs):
+    publish_task_result(sender.name, task_id, 'FAILURE', exception)
+
+
+def get_local_queue():
+    """进程内任务队列，任务名与 Celery 一致"""
+    global _local_queue
+    if _local_queue is None:
+        from face_core.taskqueue import LocalTaskQueue
+
+        setup_logger()
+        queue = LocalTaskQueue(Config.LOCAL_TASK_WORKERS)
+        queue.task(bind=True, name='app.analyze_image_task')(analyze_image_task)
+        queue.task(bind=True, name='app.analyze_images_task')(analyze_images_task)
+        queue.task(name='app.cleanup_old_files')(cleanup_old_files)
+        queue.on_finish(lambda task, task_id, state, info: publish_task_result(task.name, task_id, state, info))
+        # 模型在后台线程中加载（包括导入 DeepFace），不阻塞第一次提交任务的请求
+        threading.Thread(target=preload_models, name='model-preload', daemon=True).start()
+        # 代替 Celery beat 定时清理
+        threading.Thread(target=schedule_cleanup, args=(queue,), name='cleanup-schedule', daemon=True).start()
+        _local_queue = queue
+    return _local_queue
+
+
+def schedule_cleanup(queue):
+    while True:
+        time.sleep(Config.CLEANUP_INTERVAL)
+        queue.tasks['app.cleanup_old_files'].delay()
+
+
+def get_task_queue():
+    return get_local_queue() if Config.TASK_BACKEND == 'local' else get_celery()
+
+
+def get_task(name):
+    return get_task_queue().tasks[f'app.{name}']
+
+
+def get_redis():
+    """Redis 客户端，第一次使用时才创建"""
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.from_url(Config.REDIS_URL)
+    return _redis
+
+
+def get_event_bus():
+    """任务事件总线，第一次使用时创建；Web 进程的 Redis 订阅线程在第一个 SSE 连接时启动，并在确认订阅后才返回"""
+    global _event_bus
+    if _event_bus is None:
+        from face_core.events import EventBus, RedisEventBus
+        _event_bus = RedisEventBus(get_redis()) if Config.EVENT_BUS == 'redis' else EventBus()
+    return _event_bus
+
+
+def create_app(config=Config):
+    """应用工厂：创建文件夹、配置日志并注册路由，不加载模型也不连接 Redis"""
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    for folder in [config.UPLOAD_FOLDER, config.RESULT_FOLDER, config.LOG_FOLDER, config.METRICS_FOLDER,
+                   config.DATA_FOLDER]:
+        os.makedirs(folder, exist_ok=True)
+    setup_logger()
+
+    app.register_blueprint(bp)
+    return app
+
+
+def __getattr__(name):
+    # 兼容 `flask --app app run` 和 `celery -A app.celery worker`：模块属性在第一次访问时才创建
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    if name == 'celery':
+        return get_celery()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # 主程序
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -1,59 +1,53 @@
 import logging
-import logging.handlers
 import os
+import sys
 from datetime import datetime
-from flask import request, has_request_context
+from flask import g, request
 from config import Config
 
-
-class RequestFormatter(logging.Formatter):
-    """自定义日志格式化器，添加请求相关信息"""
-
-    def format(self, record):
-        if has_request_context():
-            record.url = request.url
-            record.remote_addr = request.remote_addr
-            record.method = request.method
-            record.user_agent = request.user_agent.string
-        else:
-            record.url = None
-            record.remote_addr = None
-            record.method = None
-            record.user_agent = None
-
-        return super().format(record)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_core.logqueue import BatchedTimedRotatingFileHandler, BatchedStreamHandler, JsonFormatter, \
+    setup_queue_logging, bind_context, reset_context
 
 
 def setup_logger(app):
-    """设置应用日志"""
+    """设置应用日志：记录经队列交给监听线程，以 JSON 格式批量写入文件和控制台"""
 
     # 创建日志文件路径
+    os.makedirs(Config.LOG_FOLDER, exist_ok=True)
     log_file = os.path.join(
         Config.LOG_FOLDER,
         f'app_{datetime.now().strftime("%Y-%m-%d")}.log'
     )
 
-    # 设置日志格式
-    formatter = RequestFormatter(
-        '%(asctime)s - %(remote_addr)s - %(method)s - %(url)s - '
-        '%(user_agent)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    formatter = JsonFormatter()
 
     # 文件处理器 - 按日期轮转
-    file_handler = logging.handlers.TimedRotatingFileHandler(
+    file_handler = BatchedTimedRotatingFileHandler(
         log_file, when='midnight', interval=1,
         backupCount=30, encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
 
     # 控制台处理器
-    console_handler = logging.StreamHandler()
+    console_handler = BatchedStreamHandler()
     console_handler.setFormatter(formatter)
 
-    # 配置根日志记录器
-    app.logger.setLevel(getattr(logging, Config.LOG_LEVEL))
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(console_handler)
+    setup_queue_logging(app.logger, [file_handler, console_handler], getattr(logging, Config.LOG_LEVEL))
+
+    # 请求信息在请求开始时读取一次，之后的日志直接带上，不再逐条读取 request
+    @app.before_request
+    def bind_request_context():
+        g.log_context_token = bind_context(
+            ip=request.remote_addr, method=request.method,
+            url=request.url, user_agent=request.user_agent.string
+        )
+
+    @app.teardown_request
+    def reset_request_context(exc):
+        token = g.pop('log_context_token', None)
+        if token is not None:
+            reset_context(token)
 
     return app.logger
 
@@ -67,32 +61,23 @@ def log_operation(operation_type):
 
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            from flask import current_app, request
+            from flask import current_app
+
+            fields = {'fields': {'operation': operation_type}}
 
             # 记录操作开始
-            current_app.logger.info(
-                f"Operation started: {operation_type} - "
-                f"IP: {request.remote_addr} - "
-                f"User-Agent: {request.user_agent}"
-            )
+            current_app.logger.info("Operation started", extra=fields)
 
             try:
                 result = f(*args, **kwargs)
                 # 记录操作成功
-                current_app.logger.info(
-                    f"Operation completed: {operation_type} - "
-                    f"IP: {request.remote_addr}"
-                )
+                current_app.logger.info("Operation completed", extra=fields)
                 return result
             except Exception as e:
                 # 记录操作失败
-                current_app.logger.error(
-                    f"Operation failed: {operation_type} - "
-                    f"IP: {request.remote_addr} - "
-                    f"Error: {str(e)}"
-                )
+                current_app.logger.error(f"Operation failed: {str(e)}", extra=fields)
                 raise
 
         return decorated_function
 
-    return decorator
\ No newline at end of file
+    return decorator
@@ -104,10 +104,13 @@ class AnalysisController {
             const data = await response.json();
 
             if (data.status === 'success') {
-                this.state.setState({
-                    analysisResults: data.results,
-                    taskId: data.taskId
-                });
+                this.state.setState({ taskId: data.task_id, progress: 0 });
+                // 任务进度和结果由服务器推送，不再轮询 /task/<task_id>
+                const result = await this._waitForTask(data.task_id);
+                if (result.status !== 'success') {
+                    throw new Error(result.message || '分析失败');
+                }
+                this.state.setState({ analysisResults: result.results });
             } else {
                 throw new Error(data.message || '分析失败');
             }
@@ -118,6 +121,33 @@ class AnalysisController {
         }
     }
 
+    // 订阅任务事件（SSE），任务完成时返回任务结果
+    _waitForTask(taskId) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`/task/${taskId}/events`);
+
+            source.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                this.state.setState({ progress: data.progress || 0 });
+
+                if (data.state === 'SUCCESS') {
+                    source.close();
+                    resolve(data.result);
+                } else if (data.state === 'FAILURE') {
+                    source.close();
+                    reject(new Error('分析失败'));
+                }
+            };
+
+            // 连接断开时浏览器会自动重连；服务器已关闭连接（CLOSED）才视为失败
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('任务状态连接已断开'));
+                }
+            };
+        });
+    }
+
     // 状态变化处理
     _handleStateChange(state) {
         // 更新预览图片
@@ -9,7 +9,8 @@ class AnalysisState {
             detectionOptions: new Set(['age', 'gender', 'emotion', 'race']), // 检测选项
             isProcessing: false,         // 是否正在处理
             error: null,                 // 错误信息
-            taskId: null                 // 任务ID
+            taskId: null,                // 任务ID
+            progress: 0                  // 任务进度（服务器推送）
         };
 
         this._listeners = new Set();     // 状态监听器
@@ -1,19 +1,112 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_file
-import cv2
-from deepface import DeepFace
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response, stream_with_context
+from werkzeug.utils import safe_join
+import io
 import os
 import json
-import pandas as pd
-from datetime import datetime
+import sys
+import threading
+import time
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_core.models import get_registry, actions_from_env
+from face_core.scheduler import BatchScheduler
+from face_core.executor import create_executor
+from face_core.cache import ResultCache, make_cache_key
+from face_core.ingest import decode_image, UploadPersister
+from face_core.video import iter_video_results, to_ndjson, to_sse
+from face_core.tracker import TrackedAnalyzer
+from face_core.batch import iter_uploaded_images, map_bounded
+from face_core.backends import DEFAULT_SOLUTION, is_supported
+from face_core.writer import get_writer
+from face_core.render import AnnotationRenderer, make_annotation, draw_annotations, encode_spec
+from face_core.storage import ArtifactIndex, ArtifactStore, ExpiryCleaner, new_key, entry
+from face_core.results_store import ResultsStore, stats_from_args
 
 app = Flask(__name__)
 
 # 配置上传文件的保存路径
 UPLOAD_FOLDER = 'static/uploads'
 RESULT_FOLDER = 'static/results'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(RESULT_FOLDER, exist_ok=True)
+
+# 预加载的检测模型（可通过环境变量 PRELOAD_ACTIONS 配置，例如 age,gender）
+PRELOAD_ACTIONS = actions_from_env()
+
+# 微批处理：并发请求的人脸凑满一批或等待超时后统一推理
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 10))
+
+# 分析执行器：inline 在请求线程内分析并在后台预热模型；process 使用本机进程池，每个进程常驻一份模型
+ANALYSIS_EXECUTOR = os.environ.get('ANALYSIS_EXECUTOR', 'inline')
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 0)) or None
+
+# 结果缓存：相同图片 + 相同检测选项直接返回上次的结果
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 3600))
+
+# 标注图片按需渲染：分析时只保存标注描述，第一次访问结果图片时才绘制和编码
+LAZY_RENDER = os.environ.get('LAZY_RENDER', '1') == '1'
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', 64))
+RENDER_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_MB', 64)) * 1024 * 1024
+RENDER_QUALITY = int(os.environ.get('RENDER_QUALITY', 90))
+
+# 是否保存上传的原图（后台异步写入，不阻塞请求）；按需渲染以原图为底图，必须保存
+SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', '1') == '1'
+
+# 结果图片和 CSV 由后台线程写入，接口先返回 JSON；访问结果文件时等待写入完成
+ARTIFACT_WRITERS = int(os.environ.get('ARTIFACT_WRITERS', 1))
+ARTIFACT_WAIT_TIMEOUT = float(os.environ.get('ARTIFACT_WAIT_TIMEOUT', 10))
+
+# 上传和结果文件以 ULID 命名，按日期分区和散列子目录保存（<目录>/YYYY/MM/DD/<两位>/），并登记到产物索引
+ARTIFACT_INDEX = os.environ.get('ARTIFACT_INDEX', 'data/artifacts.db')
+ARTIFACT_RETENTION_HOURS = float(os.environ.get('ARTIFACT_RETENTION_HOURS', 24))
+
+# 过期文件清理：后台线程每 CLEANUP_INTERVAL 秒按索引删除一次，每批 CLEANUP_BATCH_SIZE 个，每秒最多 CLEANUP_MAX_RATE 个
+CLEANUP_INTERVAL = float(os.environ.get('CLEANUP_INTERVAL', 600))
+CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 500))
+CLEANUP_MAX_RATE = int(os.environ.get('CLEANUP_MAX_RATE', 2000))
+
+# 每张人脸一行追加到结果库（后台批量写入），/stats 直接在库中聚合
+RESULTS_DB = os.environ.get('RESULTS_DB', 'data/results.db')
+
+
+def schedule_cleanup():
+    # 按过期索引分批删除上传和结果文件，再整体删除超过保留期的日期分区
+    cleaner = ExpiryCleaner(
+        [UPLOAD_FOLDER, RESULT_FOLDER], artifact_index,
+        timedelta(hours=ARTIFACT_RETENTION_HOURS), CLEANUP_BATCH_SIZE, CLEANUP_MAX_RATE
+    )
+    while True:
+        try:
+            stats = cleaner.run()
+            app.logger.info(f"Cleaned old files: {stats}")
+        except Exception as e:
+            app.logger.error(f"Cleanup error: {str(e)}")
+        time.sleep(CLEANUP_INTERVAL)
+
+
+# spawn 启动的分析进程会以 __mp_main__ 的身份重新导入本文件，只需要上面的配置；
+# 模型注册表、调度线程、执行器、写入线程和数据库连接只在 Web 进程中创建
+if __name__ != '__mp_main__':
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(RESULT_FOLDER, exist_ok=True)
+
+    model_registry = get_registry(PRELOAD_ACTIONS)
+    batch_scheduler = BatchScheduler(model_registry, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+    analysis_executor = create_executor(ANALYSIS_EXECUTOR, model_registry, batch_scheduler, ANALYSIS_WORKERS)
+
+    result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+    result_renderer = AnnotationRenderer(RESULT_FOLDER, RENDER_CACHE_SIZE, RENDER_CACHE_BYTES, RENDER_QUALITY)
+    upload_persister = UploadPersister(SAVE_UPLOADS or LAZY_RENDER)
+    artifact_writer = get_writer(ARTIFACT_WRITERS)
+
+    artifact_index = ArtifactIndex(ARTIFACT_INDEX)
+    upload_store = ArtifactStore(UPLOAD_FOLDER, artifact_index, ARTIFACT_RETENTION_HOURS * 3600)
+    result_store = ArtifactStore(RESULT_FOLDER, artifact_index, ARTIFACT_RETENTION_HOURS * 3600)
+    results_store = ResultsStore(RESULTS_DB)
+    threading.Thread(target=schedule_cleanup, name='cleanup-schedule', daemon=True).start()
+
 
 # 情绪和种族翻译字典
 EMOTION_TRANSLATIONS = {
@@ -35,6 +128,110 @@ RACE_TRANSLATIONS = {
     "indian": "印度人"
 }
 
+# 视频分析配置
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+STREAM_SCHEMES = ('rtsp://', 'rtmp://', 'http://', 'https://')
+VIDEO_MAX_SAMPLE_FPS = 30
+
+# 批量分析配置
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 1000))
+
+
+def get_actions(detection_options):
+    # 获取启用的检测选项
+    actions = [a for a in ('age', 'gender', 'emotion', 'race') if detection_options.get(a, False)]
+    if not actions:
+        raise ValueError('请至少选择一个检测选项')
+    return actions
+
+
+def format_face(idx, face):
+    # 整理单张人脸的结果数据，并返回标注框颜色
+    gender_dict = face.get('gender', {})
+    male_prob = gender_dict.get('Man', 0)
+    female_prob = gender_dict.get('Woman', 0)
+    uncertain = abs(male_prob - female_prob) <= 20
+
+    result = {
+        'id': idx + 1,
+        'gender': f"未知(男：{male_prob:.2f},女：{female_prob:.2f})" if uncertain else (
+            "男性" if male_prob > female_prob else "女性"),
+        'age': face.get('age', '未知'),
+        'emotion': EMOTION_TRANSLATIONS.get(face.get('dominant_emotion', '').lower(), '未知'),
+        'race': RACE_TRANSLATIONS.get(face.get('dominant_race', '').lower(), '未知')
+    }
+    color = (0, 0, 255) if uncertain else (0, 255, 0)
+    return result, color
+
+
+def get_solution(form):
+    # 分析方案，例如 deepface（默认）或只依赖 OpenCV 的 opencv
+    solution = form.get('solution', DEFAULT_SOLUTION)
+    if not is_supported(solution):
+        raise ValueError(f"暂不支持 {solution} 方案")
+    return solution
+
+
+def analyze_frame(frame, actions, solution=DEFAULT_SOLUTION):
+    # 先检测人脸（DeepFace 接收 BGR 图像），再对人脸做属性推理
+    analysis = analysis_executor.analyze(frame, actions, solution)
+
+    # 整理结果数据和标注，性别判断决定框的颜色
+    results, annotations = [], []
+    for idx, face in enumerate(analysis):
+        result, color = format_face(idx, face)
+        results.append(result)
+        annotations.append(make_annotation(idx, face.get('region', {}), color))
+    return results, annotations
+
+
+def video_analyzer(solution=DEFAULT_SOLUTION):
+    # 带跟踪的分析直接使用本进程的模型，只在 inline 执行器 + 默认方案下启用；
+    # 其余情况逐帧交给执行器，与图片分析走同一个进程池和分析方案
+    if ANALYSIS_EXECUTOR == 'inline' and solution == DEFAULT_SOLUTION:
+        return TrackedAnalyzer(registry=model_registry, scheduler=batch_scheduler)
+    return lambda frame, actions: analysis_executor.analyze(frame, actions, solution)
+
+
+def result_exists(filename):
+    # 结果文件已落盘、正在写入，或者可以按需渲染
+    path = safe_join(RESULT_FOLDER, filename)
+    if path is None:
+        return False
+    spec_path = result_renderer.spec_path(filename)
+    return any(os.path.exists(p) or artifact_writer.is_pending(p) for p in (path, spec_path))
+
+
+def serve_result(filename, as_attachment=False):
+    # 有标注描述的结果图片按需渲染（可用 size、quality 参数控制尺寸和质量），其余文件等待写入完成后返回
+    # 文件名来自 URL，跳出结果目录的直接返回 404
+    path = safe_join(RESULT_FOLDER, filename)
+    if path is None:
+        return jsonify({'status': 'error', 'message': '文件不存在'}), 404
+    spec_path = result_renderer.spec_path(filename)
+    if os.path.exists(spec_path) or artifact_writer.is_pending(spec_path):
+        artifact_writer.wait(spec_path, ARTIFACT_WAIT_TIMEOUT)
+        data = result_renderer.render(
+            filename, request.args.get('size', type=int), request.args.get('quality', type=int),
+            ARTIFACT_WAIT_TIMEOUT
+        )
+        if data is None:
+            return jsonify({'status': 'error', 'message': '原图不存在，无法生成结果图片'}), 404
+        return send_file(io.BytesIO(data), mimetype='image/jpeg',
+                         as_attachment=as_attachment, download_name=filename)
+
+    artifact_writer.wait(path, ARTIFACT_WAIT_TIMEOUT)
+    return send_from_directory(RESULT_FOLDER, filename, as_attachment=as_attachment)
+
+
+def format_video_face(idx, face):
+    # 视频结果额外带上跟踪 ID，同一个人在不同帧中保持一致
+    result = format_face(idx, face)[0]
+    result['track_id'] = face.get('track_id')
+    return result
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -49,100 +246,188 @@ def analyze():
 
         # 获取检测选项
         detection_options = json.loads(request.form.get('detection_options', '{}'))
+        solution = get_solution(request.form)
 
-        # 保存上传的文件
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        original_filename = f"original_{timestamp}.jpg"
-        result_filename = f"result_{timestamp}.jpg"
-        csv_filename = f"analysis_{timestamp}.csv"
+        # 命中缓存且结果文件仍在（或正在写入）时直接返回
+        image_bytes = file.read()
+        cache_key = make_cache_key(image_bytes, detection_options, solution)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            if all(result_exists(cached[k][len('/static/results/'):]) for k in ('result_image', 'csv_file')):
+                return jsonify(dict(cached, status='success', cached=True))
+            result_cache.invalidate(cache_key)
 
-        file_path = os.path.join(UPLOAD_FOLDER, original_filename)
-        file.save(file_path)
+        # 生成文件名：ULID 不会重复，同一秒内的并发请求不会互相覆盖
+        key = new_key()
+        csv_path = result_store.path_for(key, f"analysis_{key}.csv")
+        result_path = os.path.join(os.path.dirname(csv_path), f"result_{key}.jpg")
+        result_filename = result_store.relpath(result_path)
+        csv_filename = result_store.relpath(csv_path)
 
-        # 读取图像并转换颜色空间
-        frame = cv2.imread(file_path)
+        # 直接在内存中解码，原图交给后台线程保存
+        frame = decode_image(image_bytes)
         if frame is None:
             raise ValueError("无法读取图片")
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # 获取启用的检测选项
-        actions = []
-        if detection_options.get('age', False):
-            actions.append('age')
-        if detection_options.get('gender', False):
-            actions.append('gender')
-        if detection_options.get('emotion', False):
-            actions.append('emotion')
-        if detection_options.get('race', False):
-            actions.append('race')
-
-        if not actions:
-            raise ValueError('请至少选择一个检测选项')
-
-        # 使用DeepFace进行分析
-        analysis = DeepFace.analyze(
-            img_path=rgb_frame,
-            actions=actions,
-            enforce_detection=False,
-            detector_backend='opencv'
+        original_path = upload_store.path_for(key, f"original_{key}.jpg")
+        if upload_persister.save(image_bytes, original_path) is not None:
+            upload_store.register([entry(original_path, key, 'upload', image_bytes)])
+
+        actions = get_actions(detection_options)
+
+        # 检测和属性推理
+        results, annotations = analyze_frame(frame, actions, solution)
+
+        # 结果图片（或其标注描述）和 CSV 交给后台线程保存
+        if LAZY_RENDER:
+            spec_path = result_renderer.spec_path(result_filename)
+            spec = encode_spec(original_path, annotations)
+            artifact_writer.write_bytes(spec_path, spec)
+            entries = [entry(spec_path, key, 'spec', spec)]
+        else:
+            artifact_writer.write_image(result_path, draw_annotations(frame, annotations))
+            entries = [entry(result_path, key, 'image')]
+        artifact_writer.write_csv(csv_path, results)
+        result_store.register(entries + [entry(csv_path, key, 'csv')])
+        results_store.append(results, key, file.filename, solution)
+
+        response = {
+            'results': results,
+            'result_image': f'/static/results/{result_filename}',
+            'csv_file': f'/static/results/{csv_filename}'
+        }
+        result_cache.put(cache_key, response)
+
+        return jsonify(dict(response, status='success'))
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    # 多张图片（字段 images）或 ZIP 压缩包（字段 archive），返回合并结果和一份汇总 CSV
+    try:
+        detection_options = json.loads(request.form.get('detection_options', '{}'))
+        actions = get_actions(detection_options)
+        solution = get_solution(request.form)
+
+        entries = iter_uploaded_images(
+            request.files.getlist('images'),
+            request.files.get('archive'),
+            max_items=BATCH_MAX_IMAGES
         )
 
-        if not isinstance(analysis, list):
-            analysis = [analysis]
-
-        # 处理结果并绘制标注
-        results = []
-        for idx, face in enumerate(analysis):
-            region = face.get('region', {})
-            x, y, w, h = region.get('x', 0), region.get('y', 0), region.get('w', 0), region.get('h', 0)
-
-            # 性别判断决定框的颜色
-            gender_dict = face.get('gender', {})
-            male_prob = gender_dict.get('Man', 0)
-            female_prob = gender_dict.get('Woman', 0)
-
-            color = (0, 0, 255) if abs(male_prob - female_prob) <= 20 else (0, 255, 0)
-
-            # 绘制人脸框和序号
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            cv2.putText(frame, f"#{idx + 1}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-            # 整理结果数据
-            result = {
-                'id': idx + 1,
-                'gender': f"未知(男：{male_prob:.2f},女：{female_prob:.2f})" if abs(male_prob - female_prob) <= 20 else (
-                    "男性" if male_prob > female_prob else "女性"),
-                'age': face.get('age', '未知'),
-                'emotion': EMOTION_TRANSLATIONS.get(face.get('dominant_emotion', '').lower(), '未知'),
-                'race': RACE_TRANSLATIONS.get(face.get('dominant_race', '').lower(), '未知')
-            }
-            results.append(result)
-
-        # 保存结果图片
-        result_path = os.path.join(RESULT_FOLDER, result_filename)
-        cv2.imwrite(result_path, frame)
-
-        # 保存分析结果到CSV
-        df = pd.DataFrame(results)
-        csv_path = os.path.join(RESULT_FOLDER, csv_filename)
-        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        def process(item):
+            # 单张图片失败（无法解码、检测或推理出错）只记在该条结果中，不影响整批
+            name, data = item
+            frame = decode_image(data)
+            if frame is None:
+                return {'file': name, 'status': 'error', 'message': '无法读取图片', 'results': []}
+            try:
+                results = analyze_frame(frame, actions, solution)[0]
+            except Exception as e:
+                return {'file': name, 'status': 'error', 'message': str(e), 'results': []}
+            return {'file': name, 'status': 'success', 'results': results}
+
+        items = list(map_bounded(process, entries, BATCH_WORKERS))
+        if not items:
+            raise ValueError('未上传图片')
+
+        # 汇总 CSV：每张人脸一行，并注明来源文件
+        rows = [dict(result, file=item['file']) for item in items for result in item['results']]
+        key = new_key()
+        csv_path = result_store.path_for(key, f"batch_{key}.csv")
+        artifact_writer.write_csv(csv_path, rows, fieldnames=['file', 'id', 'gender', 'age', 'emotion', 'race'])
+        result_store.register([entry(csv_path, key, 'csv')])
+        csv_filename = result_store.relpath(csv_path)
+        for item in items:
+            results_store.append(item['results'], key, item['file'], solution)
 
         return jsonify({
             'status': 'success',
-            'results': results,
-            'result_image': f'/static/results/{result_filename}',
+            'total': len(items),
+            'failed': sum(1 for item in items if item['status'] != 'success'),
+            'items': items,
             'csv_file': f'/static/results/{csv_filename}'
         })
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/analyze/video', methods=['POST'])
+def analyze_video():
+    # 视频文件（字段 video）或视频流地址（字段 stream_url），结果按帧流式返回
+    try:
+        detection_options = json.loads(request.form.get('detection_options', '{}'))
+        actions = get_actions(detection_options)
+        solution = get_solution(request.form)
+        sample_fps = min(float(request.form.get('sample_fps', 1)), VIDEO_MAX_SAMPLE_FPS)
+        if sample_fps <= 0:
+            raise ValueError('sample_fps 必须大于 0')
+        max_frames = int(request.form.get('max_frames', 0)) or None
+        output_format = request.form.get('format', 'ndjson')
+
+        video = request.files.get('video')
+        stream_url = request.form.get('stream_url', '').strip()
+        temp_path = None
+
+        if video and video.filename:
+            ext = video.filename.rsplit('.', 1)[-1].lower() if '.' in video.filename else ''
+            if ext not in VIDEO_EXTENSIONS:
+                raise ValueError('不支持的视频格式')
+            # VideoCapture 只能读取路径，上传的视频先落到临时文件，分析结束后删除
+            temp_path = os.path.join(UPLOAD_FOLDER, f"video_{new_key()}.{ext}")
+            video.save(temp_path)
+            source, live = temp_path, False
+        elif stream_url.startswith(STREAM_SCHEMES):
+            source, live = stream_url, True
+        else:
+            raise ValueError('请上传视频文件或提供视频流地址')
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    def generate():
+        try:
+            events = iter_video_results(
+                source, actions, sample_fps, max_frames, live,
+                formatter=lambda analysis: [format_video_face(idx, face) for idx, face in enumerate(analysis)],
+                analyzer=video_analyzer(solution)
+            )
+            yield from (to_sse(events) if output_format == 'sse' else to_ndjson(events))
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    mimetype = 'text/event-stream' if output_format == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@app.route('/health')
+def health():
+    # 模型预热完成前返回 503，供负载均衡判断实例是否就绪
+    info = analysis_executor.health()
+    info['result_cache'] = result_cache.stats()
+    info['artifact_writer'] = {'pending': artifact_writer.pending, 'errors': artifact_writer.errors}
+    info['render_cache'] = result_renderer.stats()
+    info['results_store'] = {'pending': results_store.pending, 'dropped': results_store.dropped,
+                             'errors': results_store.errors}
+    return jsonify(info), (200 if info['ready'] else 503)
+
+@app.route('/stats')
+def stats():
+    # 参数：window=24h 或 since/until，solution，group_by=emotion,race,gender，age_bin=10，interval=1h，interval_field
+    try:
+        data = stats_from_args(results_store, request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(dict(data, status='success'))
+
+@app.route('/static/results/<path:filename>')
+def result_file(filename):
+    return serve_result(filename)
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
-    return send_file(
-        os.path.join(RESULT_FOLDER, filename),
-        as_attachment=True
-    )
+    return serve_result(filename, as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -4,6 +4,7 @@ import cv2
 import numpy as np
 import json
 import threading
+from functools import partial
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton,
                            QFileDialog, QVBoxLayout, QHBoxLayout, QWidget,
                            QDialog, QMessageBox, QCheckBox, QProgressBar,
@@ -11,7 +12,12 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton,
                            QSpinBox, QDialogButtonBox, QFormLayout)
 from PyQt5.QtGui import QImage, QPixmap, QFont, QColor
 from PyQt5.QtCore import QTimer, Qt, QSettings, pyqtSignal, QObject
-from deepface import DeepFace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_core.pipeline import detect_faces, analyze_faces, merge_results
+from face_core.ingest import read_image
+from face_core.realtime import LatestFrameCapture, InferenceWorker, ProcessInferenceWorker
+from face_core.tracker import TrackedAnalyzer
 
 class ProgressSignal(QObject):
     progress = pyqtSignal(int)
@@ -73,12 +79,23 @@ class FaceAnalysisApp(QMainWindow):
         self.view_width = self.config.get('view_width', 800)
         self.view_height = self.config.get('view_height', 600)
 
+        # 实时检测是否把推理放到独立进程（帧经共享内存环形缓冲区传递）
+        self.inference_process = str(self.config.get('inference_process', 'false')).lower() == 'true'
+
+        # 人脸检测输入的最长边上限，大图缩小后检测，人脸仍从原图裁剪（0 表示不缩放）
+        self.max_detect_side = int(self.config.get('max_detect_side', 1280))
+
         # 初始化界面
         self.init_ui()
 
         # 初始化摄像头和定时器
-        self.cap = None
+        # 实时模式分三段：采集线程只保留最新帧，推理线程分析最新帧，定时器只负责渲染
+        self.capture = None
+        self.inference = None
+        self.last_result_seq = 0
+        self.tracked_analyzer = None
         self.timer = QTimer()
+        self.timer.timeout.connect(self.update_frame)
         self.realtime_running = False
         self.current_image = None
 
@@ -127,6 +144,11 @@ class FaceAnalysisApp(QMainWindow):
         self.progress_bar.setVisible(False)
         self.main_layout.addWidget(self.progress_bar)
 
+        # 实时检测状态（采集帧数/分析帧数/丢帧数）
+        self.status_label = QLabel(self)
+        self.status_label.setVisible(False)
+        self.main_layout.addWidget(self.status_label)
+
         # 结果表格
         self.result_table = QTableWidget(self)
         self.result_table.setColumnCount(5)
@@ -191,14 +213,24 @@ class FaceAnalysisApp(QMainWindow):
     # 启动实时监测
     def start_realtime(self):
         try:
-            if self.cap is None:
-                self.cap = cv2.VideoCapture(0)
-                if not self.cap.isOpened():
-                    raise IOError("无法打开摄像头")
+            # 跟踪人脸，属性只在轨迹需要刷新时重新推理
+            if self.inference_process:
+                self.capture = LatestFrameCapture(0, ring_slots=4).open()
+                self.tracked_analyzer = None
+                self.inference = ProcessInferenceWorker(
+                    self.capture, self.get_enabled_actions, partial(TrackedAnalyzer, max_side=self.max_detect_side)
+                )
+            else:
+                self.capture = LatestFrameCapture(0).open()
+                self.tracked_analyzer = TrackedAnalyzer(max_side=self.max_detect_side)
+                self.inference = InferenceWorker(self.capture, self.get_enabled_actions, self.tracked_analyzer)
+            self.capture.start()
+            self.inference.start()
+            self.last_result_seq = 0
 
-            self.timer.timeout.connect(self.update_frame)
             self.timer.start(30)
             self.realtime_running = True
+            self.status_label.setVisible(True)
             self.start_button.setText("停止实时检测")
         except Exception as e:
             QMessageBox.warning(self, "错误", f"启动实时监测失败: {str(e)}")
@@ -206,22 +238,58 @@ class FaceAnalysisApp(QMainWindow):
 
     # 停止实时监测
     def stop_realtime(self):
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
+        if self.inference is not None:
+            self.inference.stop()
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture.join(timeout=1)
+        if self.inference is not None:
+            self.inference.join(timeout=5)
+            self.inference = None
+        if self.capture is not None:
+            # 推理进程退出后再释放共享内存
+            self.capture.close_ring()
+            self.capture = None
         self.timer.stop()
         self.realtime_running = False
+        self.status_label.setVisible(False)
         self.start_button.setText("启动实时检测")
         self.image_label.clear()
 
     # 处理结果
     def process_face_analysis(self, frame, analysis):
-        # 清空表格
-        self.result_table.setRowCount(0)
-
         if not isinstance(analysis, list):
             analysis = [analysis]
 
+        self.draw_faces(frame, analysis)
+        self.fill_result_table(analysis)
+        self.show_frame(frame)
+
+    # 绘制人脸框和序号（frame 为 RGB 图像）
+    def draw_faces(self, frame, analysis):
+        for idx, face in enumerate(analysis):
+            region = face.get('region', {})
+            x, y, w, h = region.get('x', 0), region.get('y', 0), region.get('w', 0), region.get('h', 0)
+
+            # 判断性别差异，决定框的颜色
+            gender_dict = face.get('gender', {})
+            male_prob = gender_dict.get('Man', 0)
+            female_prob = gender_dict.get('Woman', 0)
+
+            # 如果性别差异小于20%，使用红色框
+            if abs(male_prob - female_prob) <= 20:
+                color = (255, 0, 0)  # 红色
+            else:
+                color = (0, 255, 0)  # 绿色
+
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            cv2.putText(frame, f"#{idx + 1}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # 填充结果表格
+    def fill_result_table(self, analysis):
+        # 清空表格
+        self.result_table.setRowCount(0)
+
         # 设置表格行数
         self.result_table.setRowCount(len(analysis))
 
@@ -240,25 +308,10 @@ class FaceAnalysisApp(QMainWindow):
         }
 
         for idx, face in enumerate(analysis):
-            region = face.get('region', {})
-            x, y, w, h = region.get('x', 0), region.get('y', 0), region.get('w', 0), region.get('h', 0)
-
-            # 判断性别差异，决定框的颜色
             gender_dict = face.get('gender', {})
             male_prob = gender_dict.get('Man', 0)
             female_prob = gender_dict.get('Woman', 0)
 
-            # 如果性别差异小于20%，使用红色框
-            if abs(male_prob - female_prob) <= 20:
-                color = (255, 0, 0)  # 红色
-            else:
-                color = (0, 255, 0)  # 绿色
-
-            # 绘制人脸框和序号
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-            cv2.putText(frame, f"#{idx + 1}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-            # 填充表格
             # 序号
             self.result_table.setItem(idx, 0, QTableWidgetItem(f"#{idx + 1}"))
 
@@ -286,12 +339,17 @@ class FaceAnalysisApp(QMainWindow):
                 race_cn = race_translations.get(race, race)
                 self.result_table.setItem(idx, 4, QTableWidgetItem(race_cn))
 
-        # 将图片转换为Qt图像并显示
+    # 将图片转换为Qt图像并显示
+    def show_frame(self, frame):
         qt_image = QImage(frame.data, frame.shape[1], frame.shape[0], frame.strides[0], QImage.Format_RGB888)
         pixmap = QPixmap.fromImage(qt_image).scaled(self.image_label.size(), Qt.KeepAspectRatio)
         self.image_label.setPixmap(pixmap)
         self.current_image = pixmap
 
+    # 获取启用的检测选项（转换为英文）
+    def get_enabled_actions(self):
+        return [self.option_mapping[option] for option, enabled in self.detection_options.items() if enabled]
+
     # 更新进度条
     def update_progress(self, value):
         self.progress_bar.setVisible(True)
@@ -320,10 +378,13 @@ class FaceAnalysisApp(QMainWindow):
             # 在新线程中处理图片
             def process_image():
                 try:
-                    # 读取图片
+                    # 读取图片（只读取一次，检测和显示共用同一份数据）
                     self.progress_signal.progress.emit(20)
-                    frame = cv2.imread(file_path)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    bgr_frame = read_image(file_path)
+                    if bgr_frame is None:
+                        self.progress_signal.error.emit("无法读取图片")
+                        return
+                    frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
 
                     # 获取启用的检测选项
                     actions = [self.option_mapping[option] for option, enabled in
@@ -336,11 +397,8 @@ class FaceAnalysisApp(QMainWindow):
                     self.progress_signal.progress.emit(40)
 
                     # 分析图片
-                    analysis = DeepFace.analyze(
-                        img_path=file_path,
-                        actions=actions,
-                        enforce_detection=False
-                    )
+                    detections = detect_faces(bgr_frame, max_side=self.max_detect_side)
+                    analysis = merge_results(detections, analyze_faces(detections, actions))
 
                     self.progress_signal.progress.emit(80)
 
@@ -358,34 +416,41 @@ class FaceAnalysisApp(QMainWindow):
         except Exception as e:
             self.progress_signal.error.emit(str(e))
 
-    # 实时更新摄像头画面并分析
+    # 渲染最新的摄像头画面和最新的分析结果（只在界面线程中绘制，不做推理）
     def update_frame(self):
         try:
-            ret, frame = self.cap.read()
-            if not ret:
-                raise IOError("无法读取摄像头帧")
-
-            # 转换为RGB格式
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if self.capture.error is not None:
+                raise IOError(self.capture.error)
 
-            # 获取启用的检测选项（转换为英文）
-            actions = [self.option_mapping[option] for option, enabled in self.detection_options.items() if enabled]
-
-            if not actions:
-                QMessageBox.warning(self, "警告", "请至少选择一种检测选项")
+            _, frame = self.capture.latest()
+            if frame is None:
                 return
-
-            # 分析摄像头画面
-            analysis = DeepFace.analyze(
-                img_path=rgb_frame,
-                actions=actions,
-                enforce_detection=False
-            )
-
-            self.process_face_analysis(frame, analysis)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            result_seq, analysis = self.inference.latest()
+            self.draw_faces(frame, analysis)
+            if result_seq != self.last_result_seq:
+                self.fill_result_table(analysis)
+                self.last_result_seq = result_seq
+            self.show_frame(frame)
+
+            # 状态栏：丢帧数量明确展示
+            if not self.get_enabled_actions():
+                self.status_label.setText("请至少选择一种检测选项")
+            else:
+                stats = self.inference.stats()
+                status = (
+                    f"采集 {stats['captured']} 帧 | 分析 {stats['processed']} 帧 | "
+                    f"丢弃 {stats['dropped']} 帧 | 推理耗时 {stats['latency_ms']} ms"
+                )
+                if self.tracked_analyzer is not None:
+                    status += (f" | 属性推理 {self.tracked_analyzer.inferred} 次 / "
+                               f"复用 {self.tracked_analyzer.reused} 次")
+                self.status_label.setText(status)
 
         except Exception as e:
-            print(f"实时分析出错: {str(e)}")
+            QMessageBox.warning(self, "错误", f"实时监测中断: {str(e)}")
+            self.stop_realtime()
 
     # 查看大图
     def show_large_image(self, event):
@@ -442,9 +507,7 @@ class FaceAnalysisApp(QMainWindow):
             self.config.set('view_height', self.view_height)
 
     def closeEvent(self, event):
-        if self.cap is not None:
-            self.cap.release()
-        self.timer.stop()
+        self.stop_realtime()
         self.config.save()
         event.accept()
 
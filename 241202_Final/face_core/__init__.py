@@ -0,0 +1,7 @@
+# face_core/__init__.py
+"""
+人脸分析公共组件
+
+App_V2/App_V3/App_V4 以及桌面端 Code/main_Final.py 共用的分析基础设施。
+各应用通过把 241202_Final 目录加入 sys.path 来导入本包。
+"""
@@ -0,0 +1,73 @@
+# face_core/attributes.py
+"""属性模型的批量前处理与后处理，输出格式与 DeepFace.analyze 保持一致"""
+import cv2
+import numpy as np
+
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+GENDER_LABELS = ['Woman', 'Man']
+RACE_LABELS = ['asian', 'indian', 'black', 'white', 'middle eastern', 'latino hispanic']
+
+FACE_SIZE = (224, 224)
+EMOTION_SIZE = (48, 48)
+
+
+def prepare_face(face_rgb, target_size=FACE_SIZE):
+    """
+    把 DeepFace.extract_faces 得到的人脸（RGB，0~1 浮点）转换为属性模型的输入：
+    BGR、等比缩放后补黑边到 224x224
+    """
+    img = face_rgb[:, :, ::-1]
+    factor = min(target_size[0] / img.shape[0], target_size[1] / img.shape[1])
+    dsize = (max(1, int(img.shape[1] * factor)), max(1, int(img.shape[0] * factor)))
+    img = cv2.resize(img, dsize)
+
+    diff_0 = target_size[0] - img.shape[0]
+    diff_1 = target_size[1] - img.shape[1]
+    img = np.pad(
+        img,
+        ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+        'constant'
+    )
+    if img.shape[0:2] != target_size:
+        img = cv2.resize(img, target_size)
+    return img.astype(np.float32)
+
+
+def _model_input(action, faces):
+    """faces: (N, 224, 224, 3) 的 BGR 数组"""
+    if action == 'emotion':
+        grays = [cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), EMOTION_SIZE) for face in faces]
+        return np.expand_dims(np.stack(grays), axis=-1)
+    return faces
+
+
+def _postprocess(action, predictions):
+    if action == 'age':
+        return {'age': int(np.sum(predictions * np.arange(0, 101)))}
+
+    if action == 'gender':
+        return {
+            'gender': {label: float(100 * predictions[i]) for i, label in enumerate(GENDER_LABELS)},
+            'dominant_gender': GENDER_LABELS[int(np.argmax(predictions))]
+        }
+
+    labels, key = (EMOTION_LABELS, 'emotion') if action == 'emotion' else (RACE_LABELS, 'race')
+    total = predictions.sum()
+    return {
+        key: {label: float(100 * predictions[i] / total) for i, label in enumerate(labels)},
+        f'dominant_{key}': labels[int(np.argmax(predictions))]
+    }
+
+
+def predict_batch(model, action, faces):
+    """
+    对一批人脸只做一次前向计算
+    model: ModelRegistry.get(action) 返回的 DeepFace 属性模型
+    faces: prepare_face 处理后的人脸列表或 (N, 224, 224, 3) 数组
+    返回每张人脸的属性字典列表
+    """
+    if len(faces) == 0:
+        return []
+    batch = _model_input(action, np.asarray(faces, dtype=np.float32))
+    predictions = model.model(batch, training=False).numpy()
+    return [_postprocess(action, row) for row in predictions]
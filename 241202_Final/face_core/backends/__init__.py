@@ -0,0 +1,48 @@
+# face_core/backends/__init__.py
+"""
+可插拔的分析方案后端
+每个后端按方案 id 注册为 "模块:类名" 字符串，第一次被选中时才导入对应模块，
+因此依赖较重的库（TensorFlow 等）只在真正使用该方案时加载
+"""
+import importlib
+import threading
+
+DEFAULT_SOLUTION = 'deepface'
+
+# 方案 id -> "模块:类名"
+_REGISTRY = {
+    'deepface': 'face_core.backends.deepface_backend:DeepFaceBackend',
+    'opencv': 'face_core.backends.opencv_haar:HaarCascadeBackend',
+}
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def register_backend(solution_id, target):
+    """注册（或替换）一个方案后端，target 为 "模块:类名"；已创建的实例会被丢弃"""
+    with _lock:
+        _REGISTRY[solution_id] = target
+        _instances.pop(solution_id, None)
+
+
+def available_backends():
+    return list(_REGISTRY)
+
+
+def is_supported(solution_id):
+    return solution_id in _REGISTRY
+
+
+def get_backend(solution_id=DEFAULT_SOLUTION):
+    """返回方案后端的进程内单例，第一次调用时导入模块并创建实例"""
+    with _lock:
+        backend = _instances.get(solution_id)
+        if backend is None:
+            target = _REGISTRY.get(solution_id)
+            if target is None:
+                raise ValueError(f"暂不支持 {solution_id} 方案")
+            module_name, class_name = target.split(':')
+            backend = getattr(importlib.import_module(module_name), class_name)()
+            _instances[solution_id] = backend
+        return backend
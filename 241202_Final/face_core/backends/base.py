@@ -0,0 +1,33 @@
+# face_core/backends/base.py
+"""方案后端接口：detect 负责检测，attributes 负责属性推理，两者的结果格式与 face_core.pipeline 一致"""
+
+
+class SolutionBackend:
+    id = None
+    name = None
+
+    def detect(self, img, max_side=None):
+        """
+        检测人脸
+        img: BGR 图像；max_side: 检测输入的最长边上限，None 表示使用默认值
+        返回检测结果列表，每项包含 region（原图坐标）、confidence 以及预处理好的 face
+        """
+        raise NotImplementedError
+
+    def attributes(self, detections, actions, scheduler=None):
+        """
+        属性推理，返回与 detections 一一对应的属性字典列表
+        默认使用 DeepFace 属性模型（第一次调用时才导入，会同时导入 TensorFlow）
+        analyze 在 actions 为空时不调用本方法，只检测的请求不会导入 DeepFace
+        """
+        from face_core.pipeline import analyze_faces
+        return analyze_faces(detections, actions, scheduler=scheduler)
+
+    def analyze(self, img, actions, scheduler=None, max_side=None):
+        """检测加属性推理，返回格式与 DeepFace.analyze 一致（与 pipeline.merge_results 相同，但不导入 DeepFace）"""
+        detections = self.detect(img, max_side)
+        attributes = self.attributes(detections, actions, scheduler) if actions else [{} for _ in detections]
+        return [
+            dict(attrs, region=det['region'], face_confidence=det['confidence'])
+            for det, attrs in zip(detections, attributes)
+        ]
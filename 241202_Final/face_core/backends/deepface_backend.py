@@ -0,0 +1,16 @@
+# face_core/backends/deepface_backend.py
+"""DeepFace 方案：DeepFace 检测器 + DeepFace 属性模型"""
+from face_core.backends.base import SolutionBackend
+from face_core.pipeline import detect_faces, analyze_faces
+from face_core.preprocess import MAX_DETECT_SIDE
+
+
+class DeepFaceBackend(SolutionBackend):
+    id = 'deepface'
+    name = 'DeepFace'
+
+    def detect(self, img, max_side=None):
+        return detect_faces(img, max_side=MAX_DETECT_SIDE if max_side is None else max_side)
+
+    def attributes(self, detections, actions, scheduler=None):
+        return analyze_faces(detections, actions, scheduler=scheduler)
@@ -0,0 +1,61 @@
+# face_core/backends/opencv_haar.py
+"""
+OpenCV Haar 级联方案：只依赖 OpenCV 的快速人脸检测，适合对延迟敏感的请求
+属性推理仍使用 DeepFace 属性模型，只在请求了属性时才加载
+注意：只有 actions 为空（只检测）时才完全不导入 DeepFace / TensorFlow；
+目前各应用的接口都要求至少选择一个属性，所以实际请求仍会加载 DeepFace 属性模型，
+本方案节省的是检测阶段的耗时，而不是启动时间和内存
+"""
+import threading
+
+import cv2
+
+from face_core.attributes import prepare_face
+from face_core.backends.base import SolutionBackend
+from face_core.preprocess import MAX_DETECT_SIDE, downscale, scale_region, crop_face
+
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+
+
+class HaarCascadeBackend(SolutionBackend):
+    id = 'opencv'
+    name = 'OpenCV'
+
+    def __init__(self, scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        # CascadeClassifier 不是线程安全的，每个线程各用一份
+        self._local = threading.local()
+
+    @property
+    def cascade(self):
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
+            if cascade.empty():
+                raise IOError(f"无法加载 {CASCADE_FILE}")
+            self._local.cascade = cascade
+        return cascade
+
+    def detect(self, img, max_side=None):
+        small, scale = downscale(img, MAX_DETECT_SIDE if max_side is None else max_side)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces, _, weights = self.cascade.detectMultiScale3(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=self.min_size, outputRejectLevels=True
+        )
+
+        detections = []
+        for (x, y, w, h), weight in zip(faces, weights):
+            region = scale_region(
+                {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h), 'left_eye': None, 'right_eye': None},
+                scale, img.shape
+            )
+            detections.append({
+                'region': region,
+                # Haar 级联没有概率输出，这里给出的是分类器最后一级的得分
+                'confidence': round(float(weight), 2),
+                'face': prepare_face(crop_face(img, region, align=False))
+            })
+        return detections
@@ -0,0 +1,63 @@
+# face_core/batch.py
+"""批量分析：逐个读取多文件上传或 ZIP 压缩包中的图片，并在有界线程池中并行处理"""
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+MAX_ENTRY_SIZE = 16 * 1024 * 1024  # 单张图片解压后的大小上限
+
+
+def _is_image(name, extensions):
+    return '.' in name and name.rsplit('.', 1)[1].lower() in extensions
+
+
+def iter_uploaded_images(files=(), archive=None, extensions=IMAGE_EXTENSIONS, max_items=1000):
+    """
+    依次产出 (文件名, 图片字节)
+    files: 多文件上传得到的 FileStorage 列表
+    archive: ZIP 压缩包（文件对象），直接从上传流中逐个读取条目，不解压到磁盘
+    """
+    count = 0
+    for file in files:
+        if not file or not file.filename or not _is_image(file.filename, extensions):
+            continue
+        yield os.path.basename(file.filename), file.read()
+        count += 1
+        if count >= max_items:
+            return
+
+    if archive is None:
+        return
+
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _is_image(info.filename, extensions):
+                continue
+            if info.file_size > MAX_ENTRY_SIZE:
+                raise ValueError(f"压缩包中的文件过大: {info.filename}")
+            with zf.open(info) as entry:
+                data = entry.read(MAX_ENTRY_SIZE + 1)
+            if len(data) > MAX_ENTRY_SIZE:
+                raise ValueError(f"压缩包中的文件过大: {info.filename}")
+            yield info.filename, data
+            count += 1
+            if count >= max_items:
+                return
+
+
+def map_bounded(func, items, max_workers=4, max_pending=None):
+    """
+    与 executor.map 类似，按输入顺序产出结果
+    但同时在途的任务数不超过 max_pending，避免把全部输入一次性读进内存
+    """
+    max_pending = max_pending or max_workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-worker') as executor:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
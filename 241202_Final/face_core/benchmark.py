@@ -0,0 +1,272 @@
+# face_core/benchmark.py
+"""
+人脸分析流程基准测试
+输入：test_img 中的图片，以及由这些图片拼接、缩放得到的多人脸合成图（多种分辨率）
+分阶段计时：解码、检测、各属性模型、标注绘制与编码、CSV 写入
+分别在单图顺序执行和多线程并发两种模式下运行，报告各阶段 p50/p95/p99 和每秒处理图片数，结果保存为 JSON
+用法（在 241202_Final 目录下运行）：
+    python -m face_core.benchmark --actions age,gender --workers 4 --output bench.json
+    python -m face_core.benchmark --compare bench.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from face_core.ingest import decode_image
+from face_core.render import make_annotation, draw_annotations
+from face_core.writer import encode_image, encode_csv, write_atomic
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_img')
+DEFAULT_RESOLUTIONS = [640, 1280, 1920, 3840]
+DEFAULT_GRIDS = [2, 3]
+PERCENTILES = (50, 95, 99)
+
+
+def load_inputs(image_dir=DEFAULT_IMAGE_DIR, resolutions=DEFAULT_RESOLUTIONS, grids=DEFAULT_GRIDS):
+    """返回 [(名称, 编码后的字节串), ...]：原图按原样读取，合成图编码为 JPEG"""
+    paths = sorted(p for p in glob.glob(os.path.join(image_dir, '*'))
+                   if p.lower().endswith(('.png', '.jpg', '.jpeg')))
+    if not paths:
+        raise FileNotFoundError(f"{image_dir} 中没有图片")
+
+    inputs, images = [], []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        inputs.append((os.path.basename(path), data))
+        images.append(decode_image(data))
+
+    # 多人脸合成图：n x n 网格拼接，每格放一张测试图片（循环使用），再缩放到目标长边
+    for n in grids:
+        cell = 400
+        tiles = [_fit(images[i % len(images)], cell) for i in range(n * n)]
+        canvas = np.vstack([np.hstack(tiles[row * n:(row + 1) * n]) for row in range(n)])
+        for side in resolutions:
+            resized = cv2.resize(canvas, (side, side), interpolation=cv2.INTER_AREA)
+            inputs.append((f"composite_{n}x{n}_{side}.jpg", encode_image(resized, '.jpg', 90)))
+    return inputs
+
+
+def _fit(img, cell):
+    """等比缩放后居中放入 cell x cell 的黑色方格，避免人脸变形"""
+    scale = cell / max(img.shape[:2])
+    img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    tile = np.zeros((cell, cell, 3), dtype=np.uint8)
+    y, x = (cell - img.shape[0]) // 2, (cell - img.shape[1]) // 2
+    tile[y:y + img.shape[0], x:x + img.shape[1]] = img
+    return tile
+
+
+class StageTimer:
+    """收集各阶段耗时（毫秒），并发模式下多个线程共用"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds * 1000)
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            values = np.asarray(values)
+            result[stage] = dict(
+                {'count': int(values.size), 'mean_ms': round(float(values.mean()), 2)},
+                **{f'p{p}_ms': round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+            )
+        return result
+
+
+class PipelineRunner:
+    """按阶段执行一次完整的分析流程并记录每个阶段的耗时"""
+
+    def __init__(self, actions, solution='deepface', max_side=None, scheduler=None, output_dir=None):
+        from face_core.backends import get_backend
+        from face_core.models import get_registry
+
+        self.actions = actions
+        self.backend = get_backend(solution)
+        self.registry = get_registry(actions)
+        self.max_side = max_side
+        self.scheduler = scheduler
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix='face_benchmark_')
+
+    def warmup(self):
+        self.registry.start(background=False)
+        if not self.registry.is_ready():
+            raise RuntimeError(f"模型加载失败: {self.registry.error}")
+
+    def run(self, name, data, timer, index=0):
+        from face_core.attributes import predict_batch
+
+        start = time.perf_counter()
+
+        t = time.perf_counter()
+        frame = decode_image(data)
+        timer.record('decode', time.perf_counter() - t)
+        if frame is None:
+            raise ValueError(f"无法解码 {name}")
+
+        t = time.perf_counter()
+        detections = self.backend.detect(frame, self.max_side)
+        timer.record('detect', time.perf_counter() - t)
+
+        faces = [d['face'] for d in detections]
+        attributes = [{} for _ in faces]
+        if self.scheduler is not None:
+            # 微批处理时各属性模型合并在一次提交中，只能整体计时
+            t = time.perf_counter()
+            attributes = self.scheduler.analyze(faces, self.actions)
+            timer.record('attributes', time.perf_counter() - t)
+        else:
+            for action in self.actions:
+                t = time.perf_counter()
+                for attrs, result in zip(attributes, predict_batch(self.registry.get(action), action, faces)):
+                    attrs.update(result)
+                timer.record(f'attr_{action}', time.perf_counter() - t)
+
+        t = time.perf_counter()
+        annotations = [make_annotation(i, d['region'], (0, 255, 0)) for i, d in enumerate(detections)]
+        encode_image(draw_annotations(frame, annotations))
+        timer.record('annotate', time.perf_counter() - t)
+
+        t = time.perf_counter()
+        rows = [{'id': i + 1, **{k: v for k, v in attrs.items() if not isinstance(v, dict)}}
+                for i, attrs in enumerate(attributes)]
+        write_atomic(os.path.join(self.output_dir, f'bench_{index}.csv'), encode_csv(rows))
+        timer.record('csv_write', time.perf_counter() - t)
+
+        timer.record('total', time.perf_counter() - start)
+        return len(detections)
+
+
+def run_mode(runner, inputs, repeat, workers):
+    """workers=1 时顺序执行，否则用线程池并发执行；返回该模式的统计结果"""
+    timer = StageTimer()
+    jobs = [(name, data) for _ in range(repeat) for name, data in inputs]
+    faces_per_input = {}
+
+    def job(item):
+        index, (name, data) = item
+        faces_per_input[name] = runner.run(name, data, timer, index)
+
+    start = time.perf_counter()
+    if workers == 1:
+        for item in enumerate(jobs):
+            job(item)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(job, enumerate(jobs)))
+    wall = time.perf_counter() - start
+
+    return {
+        'mode': 'single' if workers == 1 else 'concurrent',
+        'workers': workers,
+        'images': len(jobs),
+        'wall_seconds': round(wall, 3),
+        'images_per_sec': round(len(jobs) / wall, 2),
+        'faces_per_input': faces_per_input,
+        'stages': timer.summary()
+    }
+
+
+def print_run(run):
+    print(f"\n[{run['mode']}] workers={run['workers']} images={run['images']} "
+          f"wall={run['wall_seconds']}s throughput={run['images_per_sec']} img/s")
+    print(f"{'stage':<14}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, s in run['stages'].items():
+        print(f"{stage:<14}{s['count']:>7}{s['mean_ms']:>10.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+
+
+def compare(report, baseline):
+    """按 (模式, 并发数, 阶段) 对比两次结果的 p50/p95，正数表示变慢"""
+    base_runs = {(r['mode'], r['workers']): r for r in baseline['runs']}
+    for run in report['runs']:
+        base = base_runs.get((run['mode'], run['workers']))
+        if base is None:
+            continue
+        print(f"\n[{run['mode']}] workers={run['workers']} 与基线对比 "
+              f"throughput {base['images_per_sec']} -> {run['images_per_sec']} img/s")
+        for stage, s in run['stages'].items():
+            b = base['stages'].get(stage)
+            if b is None:
+                continue
+            deltas = [f"p{p} {(s[f'p{p}_ms'] - b[f'p{p}_ms']) / b[f'p{p}_ms'] * 100 if b[f'p{p}_ms'] else 0:+.1f}%"
+                      for p in (50, 95)]
+            print(f"  {stage:<14}{'  '.join(deltas)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人脸分析流程基准测试')
+    parser.add_argument('--images', default=DEFAULT_IMAGE_DIR, help='测试图片目录')
+    parser.add_argument('--actions', default='age,gender,emotion,race', help='属性模型，逗号分隔')
+    parser.add_argument('--solution', default='deepface', help='分析方案，例如 deepface、opencv')
+    parser.add_argument('--resolutions', default=','.join(map(str, DEFAULT_RESOLUTIONS)), help='合成图边长')
+    parser.add_argument('--grids', default=','.join(map(str, DEFAULT_GRIDS)), help='合成图网格大小')
+    parser.add_argument('--max-side', type=int, default=None, help='检测输入最长边上限，默认使用 MAX_DETECT_SIDE')
+    parser.add_argument('--repeat', type=int, default=3, help='每张图片重复次数')
+    parser.add_argument('--workers', type=int, default=4, help='并发模式的线程数，1 表示只跑单图模式')
+    parser.add_argument('--scheduler', action='store_true', help='并发模式下属性推理使用微批处理调度器')
+    parser.add_argument('--output', default=None, help='结果 JSON 路径')
+    parser.add_argument('--compare', default=None, help='与之前保存的结果 JSON 对比')
+    args = parser.parse_args(argv)
+
+    actions = [a.strip() for a in args.actions.split(',') if a.strip()]
+    inputs = load_inputs(args.images, [int(v) for v in args.resolutions.split(',') if v],
+                         [int(v) for v in args.grids.split(',') if v])
+
+    runner = PipelineRunner(actions, args.solution, args.max_side)
+    runner.warmup()
+    # 预热一遍，排除首次推理的图构建开销
+    run_mode(runner, inputs[:1], 1, 1)
+
+    runs = [run_mode(runner, inputs, args.repeat, 1)]
+    if args.workers > 1:
+        if args.scheduler:
+            from face_core.scheduler import BatchScheduler
+            runner.scheduler = BatchScheduler(runner.registry)
+        runs.append(run_mode(runner, inputs, args.repeat, args.workers))
+        runs[-1]['scheduler'] = args.scheduler
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'actions': actions,
+            'solution': args.solution,
+            'max_side': args.max_side,
+            'repeat': args.repeat,
+            'inputs': [name for name, _ in inputs]
+        },
+        'runs': runs
+    }
+    for run in runs:
+        print_run(run)
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
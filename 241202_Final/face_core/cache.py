@@ -0,0 +1,68 @@
+# face_core/cache.py
+"""按图片内容哈希缓存分析结果，重复上传同一张图片时直接返回"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(data, detection_options, solution='deepface'):
+    """缓存键 = 图片字节的 SHA-256 + 启用的检测选项 + 分析方案"""
+    enabled = sorted(k for k, v in (detection_options or {}).items() if v)
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}:{solution}:{json.dumps(enabled)}"
+
+
+class ResultCache:
+    """带容量上限（LRU 淘汰）和过期时间（TTL）的线程安全缓存"""
+
+    def __init__(self, max_entries=256, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,160 @@
+# face_core/events.py
+"""
+任务事件推送：任务进度和完成结果发布到事件总线，Web 进程通过 SSE 推送给浏览器，客户端不再轮询
+EventBus 只在本进程内分发（任务与 Web 同进程运行时使用）
+RedisEventBus 经 Redis pub/sub 跨进程分发，每个 Web 进程只有一个订阅线程，再分发给本进程的各个连接
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+TERMINAL_STATES = ('SUCCESS', 'FAILURE')
+
+
+class Subscription:
+    """一个连接对某个任务的订阅；事件放进有界队列，积压时丢弃最旧的（进度事件会被后来的覆盖）"""
+
+    def __init__(self, bus, key, max_queue=64):
+        self.bus = bus
+        self.key = key
+        self._queue = queue.Queue(max_queue)
+
+    def put(self, event):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """返回下一个事件，超时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """进程内事件总线，同时记住每个任务最近一次的事件，晚到的订阅者可以立即拿到当前状态"""
+
+    def __init__(self, max_recent=1024):
+        self.max_recent = max_recent
+        self._subscribers = defaultdict(set)
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, key, event):
+        self._dispatch(key, event)
+
+    def _dispatch(self, key, event):
+        with self._lock:
+            self._recent[key] = event
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+            subscribers = list(self._subscribers.get(key, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self, key):
+        subscription = Subscription(self, key)
+        with self._lock:
+            self._subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+
+    def last(self, key):
+        with self._lock:
+            return self._recent.get(key)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class RedisEventBus(EventBus):
+    """
+    发布：写入 Redis 频道（任务所在的 worker 进程）
+    订阅：启动本进程唯一的监听线程，确认频道订阅成功后才返回，收到的事件按任务分发给本进程的订阅者
+    """
+
+    def __init__(self, client, channel='face_task_events', max_recent=1024, retry_interval=1.0, subscribe_timeout=5.0):
+        super().__init__(max_recent)
+        self.client = client
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self.subscribe_timeout = subscribe_timeout
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self._subscribed = threading.Event()
+
+    def publish(self, key, event):
+        self.client.publish(self.channel, json.dumps({'key': key, 'event': event}, ensure_ascii=False, default=str))
+
+    def subscribe(self, key):
+        # 等监听线程确认订阅后再返回，调用方随后查询的任务状态与之后推送的事件之间不会有空档
+        subscription = super().subscribe(key)
+        self.start()
+        return subscription
+
+    def start(self, timeout=None):
+        """启动监听线程并等待频道订阅成功，返回是否已订阅；Web 进程可在启动时调用以提前建立订阅"""
+        self._ensure_listener()
+        return self._subscribed.wait(self.subscribe_timeout if timeout is None else timeout)
+
+    def _ensure_listener(self):
+        # 线程不会随 fork 复制，子进程第一次订阅时重新启动
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._subscribed = threading.Event()
+            threading.Thread(target=self._listen, name='task-event-listener', daemon=True).start()
+            self._listener_pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message['type'] == 'subscribe':
+                        self._subscribed.set()
+                        continue
+                    if message['type'] != 'message':
+                        continue
+                    try:
+                        payload = json.loads(message['data'])
+                    except (TypeError, ValueError):
+                        continue
+                    self._dispatch(payload['key'], payload['event'])
+            except Exception:
+                # 连接断开后稍等重连；期间的事件会丢失，SSE 接口在连接时和每次心跳时都会查询任务状态
+                self._subscribed.clear()
+                time.sleep(self.retry_interval)
+
+
+def format_sse(event, event_type=None):
+    """编码为一条 Server-Sent Events 消息"""
+    lines = []
+    if event_type:
+        lines.append(f'event: {event_type}')
+    lines.append('data: ' + json.dumps(event, ensure_ascii=False, default=str))
+    return '\n'.join(lines) + '\n\n'
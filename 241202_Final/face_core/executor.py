@@ -0,0 +1,102 @@
+# face_core/executor.py
+"""
+可替换的分析执行器
+inline：在请求线程内分析（默认，配合微批处理调度器）
+process：本机进程池，每个工作进程常驻一份模型，图像经共享内存传递，不受 GIL 限制
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from face_core.backends import DEFAULT_SOLUTION, get_backend
+from face_core.models import get_registry
+from face_core.pipeline import analyze_image
+from face_core.shm import SharedArray, open_shared_array
+
+
+class InlineBackend:
+    name = 'inline'
+
+    def __init__(self, registry, scheduler=None):
+        self.registry = registry
+        self.scheduler = scheduler
+
+    def analyze(self, frame, actions, solution=DEFAULT_SOLUTION):
+        if solution == DEFAULT_SOLUTION:
+            return analyze_image(frame, actions, self.registry, self.scheduler)
+        return get_backend(solution).analyze(frame, actions, self.scheduler)
+
+    def health(self):
+        return dict(self.registry.health(), backend=self.name)
+
+    def shutdown(self):
+        pass
+
+
+def _init_worker(actions, detector_backend):
+    # 工作进程启动时加载并预热模型
+    get_registry(actions, detector_backend).start(background=False)
+
+
+def _worker_health():
+    return get_registry().health()
+
+
+def _analyze_shared(descriptor, actions, solution):
+    shm, img = open_shared_array(descriptor)
+    try:
+        if solution == DEFAULT_SOLUTION:
+            return analyze_image(img, actions)
+        return get_backend(solution).analyze(img, actions)
+    finally:
+        del img
+        shm.close()
+
+
+class ProcessPoolBackend:
+    name = 'process'
+
+    def __init__(self, max_workers=None, actions=None, detector_backend='opencv'):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # TensorFlow 不支持 fork 后继续使用，工作进程一律用 spawn 启动
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(actions, detector_backend)
+        )
+        self._warmup = []
+
+    def warmup(self):
+        """让每个工作进程都启动并完成模型加载"""
+        self._warmup = [self.pool.submit(_worker_health) for _ in range(self.max_workers)]
+        return self
+
+    def analyze(self, frame, actions, solution=DEFAULT_SOLUTION):
+        with SharedArray(frame) as shared:
+            return self.pool.submit(_analyze_shared, shared.descriptor, actions, solution).result()
+
+    def health(self):
+        done = [f for f in self._warmup if f.done()]
+        workers = [f.result() for f in done if f.exception() is None]
+        ready = bool(self._warmup) and len(workers) == len(self._warmup) and all(w['ready'] for w in workers)
+        return {
+            'backend': self.name,
+            'status': 'ready' if ready else 'loading',
+            'ready': ready,
+            'max_workers': self.max_workers,
+            'workers': workers
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_executor(kind, registry, scheduler=None, max_workers=None):
+    """根据配置创建执行器：'inline' 或 'process'"""
+    if kind == 'process':
+        return ProcessPoolBackend(max_workers, registry.actions, registry.detector_backend).warmup()
+    if kind == 'inline':
+        registry.start()
+        return InlineBackend(registry, scheduler)
+    raise ValueError(f"未知的执行器类型: {kind}")
@@ -0,0 +1,119 @@
+# face_core/frame_ring.py
+"""
+共享内存帧环形缓冲区
+采集端把帧写入固定数量的槽位，推理进程直接读取槽位视图（零拷贝）
+写满后覆盖最旧的帧而不是排队，每帧的进程间传递开销与分辨率无关
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from face_core.shm import attach_shared_memory
+
+WRITING = -1
+
+
+class SharedFrameRing:
+    """
+    内存布局：[最新序号][各槽位序号 × slots][读者占用槽位 × max_readers][槽位数据 × slots]
+    槽位序号为 -1 表示正在写入；读者读取前先占用槽位，写入端会跳过被占用的槽位
+    """
+
+    def __init__(self, shm, slots, shape, dtype, max_readers, owner):
+        self.shm = shm
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.max_readers = max_readers
+        self.owner = owner
+
+        header_len = 1 + slots + max_readers
+        self._header = np.ndarray((header_len,), dtype=np.int64, buffer=shm.buf)
+        self._slot_seq = self._header[1:1 + slots]
+        self._pins = self._header[1 + slots:]
+        self._data = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=shm.buf,
+                                offset=header_len * 8)
+        self._next_slot = 0
+
+    @classmethod
+    def create(cls, shape, dtype=np.uint8, slots=4, max_readers=4):
+        header_len = 1 + slots + max_readers
+        size = header_len * 8 + slots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        ring = cls(shm, slots, shape, dtype, max_readers, owner=True)
+        ring._header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, slots, shape, dtype, max_readers = descriptor
+        return cls(attach_shared_memory(name), slots, shape, dtype, max_readers, owner=False)
+
+    @property
+    def descriptor(self):
+        """传给其他进程用于 attach 的描述信息"""
+        return self.shm.name, self.slots, self.shape, self.dtype.str, self.max_readers
+
+    @property
+    def latest_seq(self):
+        return int(self._header[0])
+
+    # 写入端（只允许一个）
+    def write(self, frame):
+        """写入一帧，返回该帧的序号"""
+        pinned = set(int(p) - 1 for p in self._pins if p > 0)
+        for _ in range(self.slots):
+            slot = self._next_slot
+            self._next_slot = (self._next_slot + 1) % self.slots
+            if slot not in pinned:
+                break
+        else:
+            # 所有槽位都被读者占用时放弃这一帧
+            return None
+
+        seq = self.latest_seq + 1
+        self._slot_seq[slot] = WRITING
+        self._data[slot][...] = frame
+        self._slot_seq[slot] = seq
+        self._header[0] = seq
+        return seq
+
+    # 读取端
+    def read_latest(self, reader_id=0):
+        """
+        占用并返回最新一帧 (序号, 只读视图)，没有新帧时返回 (0, None)
+        用完后调用 release(reader_id) 释放槽位
+        """
+        for _ in range(3):
+            seq = self.latest_seq
+            if seq <= 0:
+                return 0, None
+            slot = self._find_slot(seq)
+            if slot is None:
+                continue
+            self._pins[reader_id] = slot + 1
+            # 占用之后再确认一次，防止占用前该槽位已开始被覆盖
+            if self._slot_seq[slot] == seq:
+                view = self._data[slot]
+                view.flags.writeable = False
+                return seq, view
+            self._pins[reader_id] = 0
+        return 0, None
+
+    def _find_slot(self, seq):
+        matches = np.flatnonzero(self._slot_seq == seq)
+        return int(matches[0]) if len(matches) else None
+
+    def is_current(self, seq):
+        """该序号的帧是否仍完整保存在某个槽位中"""
+        return self._find_slot(seq) is not None
+
+    def release(self, reader_id=0):
+        self._pins[reader_id] = 0
+
+    def close(self):
+        # 先释放对共享内存的引用再关闭
+        self._header = self._slot_seq = self._pins = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
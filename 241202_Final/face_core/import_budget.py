@@ -0,0 +1,70 @@
+# face_core/import_budget.py
+"""
+导入耗时报告：在全新的解释器中用 -X importtime 导入指定模块，按顶层包汇总耗时
+用法（在应用目录下运行）：
+    PYTHONPATH=.. python -m face_core.import_budget app --budget-ms 500
+超出预算时以非零状态码退出，可以放进部署前检查
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def measure(module, cwd=None, python=sys.executable):
+    """
+    返回 (总耗时毫秒, [(包名, 累计耗时毫秒), ...])，按耗时从高到低排序
+    耗时计在第一次导入该包的位置，已被导入过的模块不会重复计算
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"无法导入 {module}")
+
+    # -X importtime 的输出中子模块先于父模块打印，每深一层缩进两个空格
+    # 汇总目标模块直接导入的各个包（第一层），其累计耗时已包含更深层的导入
+    children, packages, total = {}, {}, 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2][1:].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        cumulative = int(fields[1]) / 1000
+        if depth == 1:
+            package = name.strip().split('.')[0]
+            children[package] = children.get(package, 0) + cumulative
+        elif depth == 0:
+            if name == module:
+                packages, total = children, cumulative
+            children = {}
+
+    return total, sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='模块导入耗时报告')
+    parser.add_argument('module', help='要导入的模块，例如 app')
+    parser.add_argument('--budget-ms', type=float, default=None, help='导入耗时预算（毫秒）')
+    parser.add_argument('--top', type=int, default=15, help='显示耗时最高的前 N 个包')
+    args = parser.parse_args(argv)
+
+    total, packages = measure(args.module, cwd=os.getcwd())
+    print(f"{'package':<30}{'cumulative ms':>15}")
+    for package, ms in packages[:args.top]:
+        print(f"{package:<30}{ms:>15.1f}")
+    print(f"{'total (' + args.module + ')':<30}{total:>15.1f}")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"超出导入耗时预算：{total:.1f}ms > {args.budget_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
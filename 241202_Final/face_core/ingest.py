@@ -0,0 +1,56 @@
+# face_core/ingest.py
+"""图片读入：直接在内存中解码上传内容，原图按配置在后台异步落盘"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from face_core.writer import write_atomic
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    """把上传的字节流解码为 BGR 图像，无法解码时返回 None"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, flags)
+
+
+def read_image(path, flags=cv2.IMREAD_COLOR):
+    """读取本地图片文件（支持中文路径），无法解码时返回 None"""
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), flags)
+
+
+class UploadPersister:
+    """在后台线程中保存原图，不占用请求线程"""
+
+    def __init__(self, enabled=True, max_workers=2):
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-writer')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def save(self, data, path):
+        """提交保存任务；未启用时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._write, data, path)
+
+    def _write(self, data, path):
+        try:
+            # 先写临时文件再重命名，避免读到写了一半的文件；临时文件名带线程号，同名并发写入不会互相覆盖
+            write_atomic(path, data)
+            return path
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
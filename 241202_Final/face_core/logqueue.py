@@ -0,0 +1,167 @@
+# face_core/logqueue.py
+"""
+非阻塞日志：业务线程只把日志记录放进队列，由监听线程格式化为 JSON 并批量写入文件
+请求上下文（IP、方法、路径等）在每个请求开始时记录一次，之后的日志直接引用，不再逐条读取 request
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from face_core.metrics import current_trace
+
+_log_context = contextvars.ContextVar('log_context', default=None)
+
+
+def bind_context(**fields):
+    """为当前请求（或任务）设置日志上下文，返回用于 reset_context 的令牌"""
+    return _log_context.set(fields)
+
+
+def reset_context(token):
+    _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在业务线程中给日志记录附上上下文和 trace_id（只是引用，不做格式化）"""
+
+    def filter(self, record):
+        record.context = _log_context.get()
+        trace = current_trace()
+        record.trace_id = trace.trace_id if trace is not None else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON；extra={'fields': {...}} 传入的字段原样并入"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': f'{record.filename}:{record.lineno}'
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        if getattr(record, 'context', None):
+            entry.update(record.context)
+        if getattr(record, 'fields', None):
+            entry.update(record.fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BatchFlushMixin:
+    """
+    StreamHandler 每写一条就 flush 一次；这里改为累计 flush_every 条再 flush，
+    其余的由监听线程在队列空闲时统一 flush，关闭时全部写出
+    """
+    flush_every = 64
+
+    def flush(self):
+        self._unflushed = getattr(self, '_unflushed', 0) + 1
+        if self._unflushed >= self.flush_every:
+            self.force_flush()
+
+    def force_flush(self):
+        self._unflushed = 0
+        super().flush()
+
+    def close(self):
+        self.force_flush()
+        super().close()
+
+
+class BatchedTimedRotatingFileHandler(BatchFlushMixin, TimedRotatingFileHandler):
+    pass
+
+
+class BatchedStreamHandler(BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchingQueueListener(QueueListener):
+    """队列空闲超过 flush_interval 秒时 flush 所有处理器，保证日志最多延迟这么久落盘"""
+
+    def __init__(self, log_queue, *handlers, flush_interval=1.0):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    getattr(handler, 'force_flush', handler.flush)()
+
+
+class QueueingHandler(QueueHandler):
+    """
+    业务线程中的日志处理器：记录放进有界队列后立即返回，队列满时丢弃并计数
+    fork 出的子进程（如 Celery worker）没有监听线程，第一次写日志时重新创建队列和监听器
+    """
+
+    def __init__(self, handlers, flush_interval=1.0, max_queue=10000):
+        self.targets = list(handlers)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.pid = None
+        self.listener = None
+        self._start_lock = threading.Lock()
+        super().__init__(queue.Queue(max_queue))
+        self.addFilter(ContextFilter())
+        self._start()
+
+    def _start(self):
+        with self._start_lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.max_queue)
+            self.listener = BatchingQueueListener(self.queue, *self.targets, flush_interval=self.flush_interval)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def prepare(self, record):
+        # 只把参数并入消息（避免之后参数对象被修改），异常信息保留给监听线程格式化
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # 停止监听线程前会先处理完队列中剩余的日志
+        if self.pid == os.getpid() and self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def setup_queue_logging(logger, handlers, level=logging.INFO, flush_interval=1.0, max_queue=10000):
+    """
+    把 logger 的输出改为经队列交给监听线程处理，handlers 在监听线程中执行
+    返回 QueueingHandler；进程退出时 logging.shutdown 会关闭它并写出剩余日志
+    """
+    queue_handler = QueueingHandler(handlers, flush_interval, max_queue)
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    return queue_handler
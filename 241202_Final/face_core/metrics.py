@@ -0,0 +1,223 @@
+# face_core/metrics.py
+"""
+分阶段计时与 Prometheus 文本格式的指标输出，不依赖外部服务
+span(stage) 记录一个阶段的耗时到直方图，并附加到当前 trace（如果有）
+多进程部署（如 Celery worker）时，各进程把指标快照写入同一目录，/metrics 合并后输出
+已退出进程留下的快照在合并时删除
+"""
+import atexit
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from face_core.writer import write_atomic
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值元组 -> [各桶计数..., 总和, 总数]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'documentation': self.documentation,
+                'labelnames': list(self.labelnames),
+                'buckets': list(self.buckets),
+                'values': [[list(key), list(state)] for key, state in self._values.items()]
+            }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+        self._atexit_pid = None
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+            return metric
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def dump(self, directory, min_interval=1.0):
+        """
+        把本进程的指标快照写入 directory/<pid>.json；距上次写入不足 min_interval 秒时跳过
+        第一次写入时注册进程退出前的最后一次写入，节流期间记录的指标不会丢失
+        """
+        if self._atexit_pid != os.getpid():
+            self._atexit_pid = os.getpid()
+            atexit.register(self.dump, directory, 0)
+        now = time.monotonic()
+        if now - self._last_dump < min_interval:
+            return False
+        self._last_dump = now
+        os.makedirs(directory, exist_ok=True)
+        write_atomic(os.path.join(directory, f'{os.getpid()}.json'), json.dumps(self.snapshot()).encode('utf-8'))
+        return True
+
+    def render(self, directory=None):
+        """输出 Prometheus 文本格式；指定 directory 时合并其他进程写入的快照，并删除已退出进程的快照"""
+        snapshots = [self.snapshot()]
+        if directory:
+            for path in glob.glob(os.path.join(directory, '*.json')):
+                name = os.path.splitext(os.path.basename(path))[0]
+                if name == str(os.getpid()):
+                    continue
+                if name.isdigit() and not _pid_alive(int(name)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return render_snapshots(snapshots)
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # Windows 上 os.kill 会结束目标进程，改为查询进程句柄
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED：进程存在但无权查询
+        code = ctypes.c_ulong()
+        alive = kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) and code.value == 259  # STILL_ACTIVE
+        kernel32.CloseHandle(handle)
+        return bool(alive)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, values={}))
+            if target['buckets'] != metric['buckets']:
+                continue
+            for key, state in metric['values']:
+                current = target['values'].get(tuple(key))
+                target['values'][tuple(key)] = state if current is None else [a + b for a, b in zip(current, state)]
+    return merged
+
+
+def _escape(value):
+    # Prometheus 文本格式中标签值的反斜杠、双引号和换行需要转义
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_snapshots(snapshots):
+    lines = []
+    for name, metric in sorted(_merge(snapshots).items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} histogram")
+        labelnames = metric['labelnames']
+        for key, state in sorted(metric['values'].items()):
+            for bound, count in zip(metric['buckets'], state):
+                labels = _format_labels(labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{name}_bucket{labels} {count}")
+            labels = _format_labels(labelnames, key, 'le="+Inf"')
+            lines.append(f"{name}_bucket{labels} {state[-1]}")
+            labels = _format_labels(labelnames, key)
+            lines.append(f"{name}_sum{labels} {state[-2]}")
+            lines.append(f"{name}_count{labels} {state[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+# 进程内默认指标
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram(
+    'face_stage_duration_seconds', '人脸分析各阶段耗时（秒）', ('stage',)
+)
+
+
+# trace：一次请求（及其 Celery 任务）内的所有阶段共享同一个 trace_id
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.spans = []
+
+
+_current_trace = contextvars.ContextVar('face_trace', default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """开启一个 trace；trace_id 为空时生成新的，传入上游的 trace_id 即可把任务与请求关联起来"""
+    current = Trace(trace_id)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def observe(stage, seconds):
+    """记录一个阶段的耗时（已在别处计时的情况，例如后台写入线程）"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    current = _current_trace.get()
+    if current is not None:
+        current.spans.append({'stage': stage, 'ms': round(seconds * 1000, 2)})
+
+
+@contextmanager
+def span(stage):
+    """对 with 块计时，记入阶段直方图和当前 trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
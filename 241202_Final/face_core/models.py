@@ -0,0 +1,152 @@
+# face_core/models.py
+"""模型注册表：在进程启动时预加载并预热 DeepFace 属性模型"""
+import os
+import threading
+import time
+
+import numpy as np
+from deepface import DeepFace
+
+# 检测选项与 DeepFace 属性模型名称的对应关系
+ACTION_MODELS = {
+    'age': 'Age',
+    'gender': 'Gender',
+    'emotion': 'Emotion',
+    'race': 'Race'
+}
+
+DEFAULT_ACTIONS = ['age', 'gender', 'emotion', 'race']
+DETECTOR_BACKEND = 'opencv'
+
+
+def actions_from_env(name='PRELOAD_ACTIONS', default=None):
+    """从环境变量读取需要预加载的检测选项，例如 PRELOAD_ACTIONS=age,gender"""
+    value = os.environ.get(name)
+    if not value:
+        return list(default or DEFAULT_ACTIONS)
+    return [a.strip() for a in value.split(',') if a.strip() in ACTION_MODELS]
+
+
+class ModelRegistry:
+    """每个工作进程内常驻的一组属性模型"""
+
+    def __init__(self, actions=None, detector_backend=DETECTOR_BACKEND):
+        self.actions = [a for a in (actions or DEFAULT_ACTIONS) if a in ACTION_MODELS]
+        self.detector_backend = detector_backend
+        self.models = {}
+        self.state = 'idle'  # idle / loading / ready / failed
+        self.error = None
+        self.load_seconds = None
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self, background=True):
+        """开始预加载；background=True 时在后台线程中进行，不阻塞启动"""
+        with self._lock:
+            if self.state in ('loading', 'ready'):
+                return self
+            self.state = 'loading'
+            self.error = None
+
+        if background:
+            self._thread = threading.Thread(target=self._load, name='model-warmup', daemon=True)
+            self._thread.start()
+        else:
+            self._load()
+        return self
+
+    def _load(self):
+        start_time = time.perf_counter()
+        try:
+            for action in self.actions:
+                self.models[action] = DeepFace.build_model(
+                    model_name=ACTION_MODELS[action],
+                    task='facial_attribute'
+                )
+
+            # 用一张空白图片跑一遍完整流程，让检测器和计算图都完成初始化
+            dummy = np.zeros((224, 224, 3), dtype=np.uint8)
+            DeepFace.analyze(
+                img_path=dummy,
+                actions=self.actions,
+                enforce_detection=False,
+                detector_backend=self.detector_backend,
+                silent=True
+            )
+
+            self.load_seconds = round(time.perf_counter() - start_time, 3)
+            self.state = 'ready'
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """等待预加载结束，返回模型是否可用"""
+        if self.state == 'idle':
+            self.start(background=False)
+        self._ready.wait(timeout)
+        return self.state == 'ready'
+
+    def is_ready(self):
+        return self.state == 'ready'
+
+    def get(self, action):
+        """获取某个检测选项对应的常驻模型"""
+        if action not in ACTION_MODELS:
+            raise ValueError(f"未知的检测选项: {action}")
+        self.wait_ready()
+        model = self.models.get(action)
+        if model is None:
+            # 配置中未预加载的选项，首次使用时再加载并常驻
+            with self._lock:
+                model = self.models.get(action)
+                if model is None:
+                    model = DeepFace.build_model(
+                        model_name=ACTION_MODELS[action],
+                        task='facial_attribute'
+                    )
+                    self.models[action] = model
+        return model
+
+    def analyze(self, img, actions):
+        """在模型就绪后调用 DeepFace.analyze"""
+        self.wait_ready()
+        for action in actions:
+            self.get(action)
+        return DeepFace.analyze(
+            img_path=img,
+            actions=actions,
+            enforce_detection=False,
+            detector_backend=self.detector_backend,
+            silent=True
+        )
+
+    def health(self):
+        """健康检查信息"""
+        return {
+            'status': self.state,
+            'ready': self.is_ready(),
+            'pid': self.pid,
+            'actions': self.actions,
+            'loaded_models': sorted(self.models.keys()),
+            'detector_backend': self.detector_backend,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(actions=None, detector_backend=DETECTOR_BACKEND):
+    """返回当前进程唯一的模型注册表（fork 出的子进程会重新创建）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.pid != os.getpid():
+            _registry = ModelRegistry(actions, detector_backend)
+        return _registry
@@ -0,0 +1,76 @@
+# face_core/pipeline.py
+"""
+两阶段人脸分析流程
+第一阶段：每张图片只做一次人脸检测、对齐和预处理
+第二阶段：只把人脸送入请求的属性模型（年龄/性别/情绪/种族）
+"""
+from deepface import DeepFace
+
+from face_core.attributes import prepare_face, predict_batch
+from face_core.models import get_registry
+from face_core.preprocess import MAX_DETECT_SIDE, downscale, scale_region, crop_face
+
+
+def detect_faces(img, detector_backend=None, registry=None, max_side=MAX_DETECT_SIDE):
+    """
+    第一阶段：检测人脸
+    img: BGR 图像（numpy 数组）
+    max_side: 检测输入的最长边上限，超过时在缩小的副本上检测，人脸仍从原图裁剪
+    返回检测结果列表，每项包含 region（原图坐标）、confidence 以及预处理好的 face
+    """
+    registry = registry or get_registry()
+    registry.wait_ready()
+
+    small, scale = downscale(img, max_side)
+    detections = []
+    for obj in DeepFace.extract_faces(
+        img_path=small,
+        detector_backend=detector_backend or registry.detector_backend,
+        enforce_detection=False,
+        align=True
+    ):
+        region, face = obj['facial_area'], obj['face']
+        if scale != 1.0:
+            region = scale_region(region, scale, img.shape)
+            face = crop_face(img, region)
+        if face.shape[0] == 0 or face.shape[1] == 0:
+            continue
+        detections.append({
+            'region': region,
+            'confidence': obj['confidence'],
+            'face': prepare_face(face)
+        })
+    return detections
+
+
+def analyze_faces(detections, actions, registry=None, scheduler=None):
+    """
+    第二阶段：对检测结果运行属性模型
+    传入 scheduler 时与其他请求合并成批推理，否则在当前线程内整批推理
+    返回与 detections 一一对应的属性字典列表
+    """
+    faces = [d['face'] for d in detections]
+    if scheduler is not None:
+        return scheduler.analyze(faces, actions)
+
+    registry = registry or get_registry()
+    attributes = [{} for _ in faces]
+    for action in actions:
+        for attrs, result in zip(attributes, predict_batch(registry.get(action), action, faces)):
+            attrs.update(result)
+    return attributes
+
+
+def merge_results(detections, attributes):
+    """合并两阶段结果，格式与 DeepFace.analyze 的返回值一致"""
+    return [
+        dict(attrs, region=det['region'], face_confidence=det['confidence'])
+        for det, attrs in zip(detections, attributes)
+    ]
+
+
+def analyze_image(img, actions, registry=None, scheduler=None):
+    """完整流程：检测一次，再运行请求的属性模型"""
+    detections = detect_faces(img, registry=registry)
+    attributes = analyze_faces(detections, actions, registry, scheduler)
+    return merge_results(detections, attributes)
@@ -0,0 +1,63 @@
+# face_core/preprocess.py
+"""
+检测前的缩放与人脸区域裁剪
+人脸检测在缩小后的图像上进行，检测框映射回原图坐标，属性模型使用的人脸从原图中裁剪
+检测耗时随像素数增长，而千万像素的照片相比 1280 像素的输入对检测几乎没有帮助
+"""
+import os
+
+import cv2
+import numpy as np
+
+# 检测输入的最长边上限，0 表示不缩放（可通过环境变量 MAX_DETECT_SIDE 配置）
+MAX_DETECT_SIDE = int(os.environ.get('MAX_DETECT_SIDE', 1280))
+
+
+def downscale(img, max_side=MAX_DETECT_SIDE):
+    """按最长边缩小图像，返回 (缩小后的图像, 缩放比例)；无需缩放时原样返回，比例为 1"""
+    longest = max(img.shape[:2])
+    if not max_side or longest <= max_side:
+        return img, 1.0
+    scale = max_side / longest
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+
+def scale_region(region, scale, shape):
+    """把缩小图像上的检测框（含双眼坐标）映射回原图坐标，并限制在图像范围内"""
+    height, width = shape[:2]
+    x = min(max(int(round(region['x'] / scale)), 0), width - 1)
+    y = min(max(int(round(region['y'] / scale)), 0), height - 1)
+    mapped = dict(
+        region,
+        x=x,
+        y=y,
+        w=max(1, min(int(round(region['w'] / scale)), width - x)),
+        h=max(1, min(int(round(region['h'] / scale)), height - y))
+    )
+    for eye in ('left_eye', 'right_eye'):
+        if region.get(eye) is not None:
+            mapped[eye] = (int(round(region[eye][0] / scale)), int(round(region[eye][1] / scale)))
+    return mapped
+
+
+def crop_face(img, region, align=True):
+    """
+    从原图裁剪人脸，返回与 DeepFace.extract_faces 相同格式的 RGB 0~1 浮点图像
+    align=True 且有双眼坐标时，先在带边距的局部区域内按双眼连线旋转摆正
+    """
+    x, y, w, h = region['x'], region['y'], region['w'], region['h']
+    left_eye, right_eye = region.get('left_eye'), region.get('right_eye')
+
+    if align and left_eye is not None and right_eye is not None:
+        height, width = img.shape[:2]
+        x0, y0 = max(0, x - w // 2), max(0, y - h // 2)
+        x1, y1 = min(width, x + w + w // 2), min(height, y + h + h // 2)
+        patch = img[y0:y1, x0:x1]
+        angle = float(np.degrees(np.arctan2(left_eye[1] - right_eye[1], left_eye[0] - right_eye[0])))
+        matrix = cv2.getRotationMatrix2D((x + w / 2 - x0, y + h / 2 - y0), angle, 1.0)
+        patch = cv2.warpAffine(patch, matrix, (patch.shape[1], patch.shape[0]), flags=cv2.INTER_CUBIC)
+        face = patch[y - y0:y - y0 + h, x - x0:x - x0 + w]
+    else:
+        face = img[y:y + h, x:x + w]
+
+    return face[:, :, ::-1].astype(np.float32) / 255
@@ -0,0 +1,280 @@
+# face_core/realtime.py
+"""
+实时检测的三段式流水线
+采集线程：只保留最新一帧；推理线程：按 CPU 能力处理最新帧；界面：渲染最新帧和最新结果
+推理跟不上时旧帧被直接覆盖，并记入丢帧计数
+推理放到独立进程时，帧通过共享内存环形缓冲区传递
+"""
+import multiprocessing
+import queue
+import threading
+import time
+
+import cv2
+
+from face_core.frame_ring import SharedFrameRing
+from face_core.models import get_registry
+from face_core.pipeline import analyze_image
+
+
+class LatestFrameCapture(threading.Thread):
+    """摄像头采集线程，只保留最新一帧"""
+
+    def __init__(self, source=0, ring_slots=None):
+        super().__init__(name='camera-capture', daemon=True)
+        self.source = source
+        self.cap = None
+        # ring_slots 不为空时，同时把帧写入共享内存环形缓冲区供推理进程读取
+        self.ring_slots = ring_slots
+        self.ring = None
+        self.ring_ready = threading.Event()
+        self.error = None
+        self.captured = 0  # 采集到的帧数
+        self._frame = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise IOError("无法打开摄像头")
+        return self
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    raise IOError("无法读取摄像头帧")
+                if self.ring_slots:
+                    if self.ring is None:
+                        self.ring = SharedFrameRing.create(frame.shape, frame.dtype, self.ring_slots)
+                        self.ring_ready.set()
+                    self.ring.write(frame)
+                with self._cond:
+                    self._frame = frame
+                    self._seq += 1
+                    self.captured += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.cap.release()
+            self.ring_ready.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    def close_ring(self):
+        """推理进程退出后释放共享内存"""
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def latest(self):
+        """返回 (序号, 最新帧)，尚无画面时帧为 None"""
+        with self._cond:
+            return self._seq, self._frame
+
+    def wait_newer(self, seq, timeout=0.5):
+        """等待比 seq 更新的帧"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq > seq or self._stop_event.is_set() or self.error is not None,
+                timeout
+            )
+            return self._seq, self._frame
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+
+
+class InferenceWorker(threading.Thread):
+    """推理线程：每次取最新帧分析，中间被覆盖的帧计为丢帧"""
+
+    def __init__(self, capture, get_actions, analyze=None):
+        super().__init__(name='realtime-inference', daemon=True)
+        self.capture = capture
+        self.get_actions = get_actions
+        self.analyze = analyze or (lambda frame, actions: analyze_image(frame, actions))
+        self.error = None
+        self.processed = 0  # 完成分析的帧数
+        self.dropped = 0    # 因推理跟不上而跳过的帧数
+        self.last_latency = 0.0
+        self._result = (0, [])
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        seq = 0
+        while not self._stop_event.is_set():
+            new_seq, frame = self.capture.wait_newer(seq)
+            if frame is None or new_seq == seq:
+                if self.capture.error is not None:
+                    break
+                continue
+
+            if seq:
+                self.dropped += new_seq - seq - 1
+            seq = new_seq
+
+            actions = self.get_actions()
+            if not actions:
+                continue
+
+            try:
+                start_time = time.perf_counter()
+                analysis = self.analyze(frame, actions)
+                self.last_latency = time.perf_counter() - start_time
+            except Exception as e:
+                self.error = str(e)
+                continue
+
+            with self._lock:
+                self._result = (seq, analysis)
+                self.processed += 1
+
+    def latest(self):
+        """返回 (分析所用帧的序号, 分析结果)"""
+        with self._lock:
+            return self._result
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return {
+            'captured': self.capture.captured,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'latency_ms': round(self.last_latency * 1000, 1)
+        }
+
+
+def _inference_process(descriptor, control, results, stop_event, analyzer_factory):
+    """推理进程主循环：从环形缓冲区读取最新帧（零拷贝视图）并分析"""
+    ring = SharedFrameRing.attach(descriptor)
+    get_registry().start(background=False)
+    analyze = analyzer_factory() if analyzer_factory else (lambda frame, actions: analyze_image(frame, actions))
+    actions, last_seq, dropped, torn = [], 0, 0, 0
+
+    try:
+        while not stop_event.is_set():
+            try:
+                while True:
+                    actions = control.get_nowait()
+            except queue.Empty:
+                pass
+
+            seq, frame = ring.read_latest()
+            if frame is None or seq == last_seq or not actions:
+                frame = None
+                ring.release()
+                time.sleep(0.005)
+                continue
+
+            if last_seq:
+                dropped += seq - last_seq - 1
+            last_seq = seq
+
+            start_time = time.perf_counter()
+            try:
+                analysis = analyze(frame, actions)
+            except Exception as e:
+                analysis, error = [], str(e)
+            else:
+                error = None
+            latency = time.perf_counter() - start_time
+            if not ring.is_current(seq):
+                torn += 1
+            frame = None
+            ring.release()
+
+            # 结果队列只保留最新一条
+            message = (seq, analysis, dropped, torn, latency, error)
+            try:
+                results.put_nowait(message)
+            except queue.Full:
+                try:
+                    results.get_nowait()
+                except queue.Empty:
+                    pass
+                results.put_nowait(message)
+    finally:
+        ring.close()
+
+
+class ProcessInferenceWorker(threading.Thread):
+    """
+    与 InferenceWorker 接口一致，但推理在独立进程中进行
+    本线程只负责同步检测选项和接收结果；capture 需以 ring_slots 参数创建
+    """
+
+    def __init__(self, capture, get_actions, analyzer_factory=None):
+        super().__init__(name='realtime-inference-proxy', daemon=True)
+        self.capture = capture
+        self.get_actions = get_actions
+        self.analyzer_factory = analyzer_factory
+        self.error = None
+        self.processed = 0
+        self.dropped = 0
+        self.torn = 0  # 分析期间被覆盖的帧数
+        self.last_latency = 0.0
+        self._result = (0, [])
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        ctx = multiprocessing.get_context('spawn')
+        self._control = ctx.Queue()
+        self._results = ctx.Queue(maxsize=1)
+        self._process_stop = ctx.Event()
+        self._ctx = ctx
+        self.process = None
+
+    def run(self):
+        self.capture.ring_ready.wait()
+        if self.capture.ring is None:
+            return
+        self.process = self._ctx.Process(
+            target=_inference_process,
+            args=(self.capture.ring.descriptor, self._control, self._results,
+                  self._process_stop, self.analyzer_factory),
+            daemon=True
+        )
+        self.process.start()
+
+        actions = None
+        while not self._stop_event.is_set():
+            current = self.get_actions()
+            if current != actions:
+                actions = current
+                self._control.put(actions)
+            try:
+                seq, analysis, dropped, torn, latency, error = self._results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._result = (seq, analysis)
+                self.processed += 1
+                self.dropped, self.torn, self.last_latency, self.error = dropped, torn, latency, error
+
+        self._process_stop.set()
+        self.process.join(timeout=5)
+
+    def latest(self):
+        with self._lock:
+            return self._result
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return {
+            'captured': self.capture.captured,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'latency_ms': round(self.last_latency * 1000, 1)
+        }
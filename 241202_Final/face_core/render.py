@@ -0,0 +1,129 @@
+# face_core/render.py
+"""
+标注图片按需渲染
+分析时只保存一份很小的标注描述（原图路径 + 人脸框），结果图片在第一次被访问时才绘制和编码
+渲染结果放入有上限的缓存，按 (文件名, 尺寸, 质量) 区分
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from face_core.ingest import read_image
+from face_core.writer import wait_for_file
+
+SPEC_SUFFIX = '.json'
+
+
+def make_annotation(idx, region, color, label=True):
+    """单张人脸的标注：框、颜色和序号文字"""
+    return {
+        'box': [int(region.get('x', 0)), int(region.get('y', 0)), int(region.get('w', 0)), int(region.get('h', 0))],
+        'color': [int(c) for c in color],
+        'label': f"#{idx + 1}" if label else None
+    }
+
+
+def draw_annotations(frame, annotations):
+    """在图像上绘制人脸框和序号（原地修改）"""
+    for item in annotations:
+        x, y, w, h = item['box']
+        color = tuple(item['color'])
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        if item.get('label'):
+            cv2.putText(frame, item['label'], (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+
+def encode_spec(source_path, annotations):
+    """标注描述序列化为 JSON 字节串，原图路径保存为绝对路径"""
+    return json.dumps(
+        {'source': os.path.abspath(source_path), 'annotations': annotations},
+        ensure_ascii=False
+    ).encode('utf-8')
+
+
+class AnnotationRenderer:
+    """根据标注描述渲染结果图片，渲染结果放入按条数和字节数限制的 LRU 缓存"""
+
+    def __init__(self, result_folder, max_entries=64, max_bytes=64 * 1024 * 1024,
+                 default_quality=90, max_size=4096):
+        self.result_folder = result_folder
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_quality = default_quality
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def spec_path(self, filename):
+        """标注描述的路径；filename 来自请求 URL，含 .. 或绝对路径而跳出结果目录时抛出 ValueError"""
+        root = os.path.realpath(self.result_folder)
+        path = os.path.realpath(os.path.join(root, filename + SPEC_SUFFIX))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"无效的文件名: {filename}")
+        return os.path.join(self.result_folder, filename + SPEC_SUFFIX)
+
+    def has_spec(self, filename):
+        try:
+            return os.path.exists(self.spec_path(filename))
+        except ValueError:
+            return False
+
+    def render(self, filename, size=None, quality=None, wait_timeout=0):
+        """
+        返回 JPEG 字节串，没有标注描述或原图时返回 None
+        size 为长边像素上限（不放大），quality 为 JPEG 质量；原图仍在后台保存时最多等待 wait_timeout 秒
+        """
+        quality = min(max(int(quality or self.default_quality), 10), 95)
+        size = min(int(size), self.max_size) if size else None
+        key = (filename, size, quality)
+
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return data
+
+        try:
+            with open(self.spec_path(filename), 'rb') as f:
+                spec = json.loads(f.read().decode('utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+        frame = read_image(spec['source']) if wait_for_file(spec['source'], wait_timeout) else None
+        if frame is None:
+            return None
+
+        draw_annotations(frame, spec['annotations'])
+        if size and max(frame.shape[:2]) > size:
+            scale = size / max(frame.shape[:2])
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            return None
+        data = buffer.tobytes()
+
+        with self._lock:
+            self.renders += 1
+            if key not in self._cache and len(data) <= self.max_bytes:
+                self._cache[key] = data
+                self._bytes += len(data)
+                while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'renders': self.renders
+            }
@@ -0,0 +1,275 @@
+# face_core/results_store.py
+"""
+人脸分析结果库：每张人脸一行追加到 SQLite（WAL 模式），按时间和属性建索引
+统计查询（各情绪/种族/性别的人数、年龄分布、按时间分桶的趋势）直接在库中聚合，不再读取各次分析的 CSV
+追加由后台线程批量写入，请求线程只把结果放进队列
+"""
+import atexit
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+GROUP_FIELDS = ('gender', 'emotion', 'race', 'solution')
+UNKNOWN = '未知'
+
+
+class ResultsStore:
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS faces ('
+        ' id INTEGER PRIMARY KEY,'
+        ' created_at REAL NOT NULL,'
+        ' day TEXT NOT NULL,'
+        ' analysis_key TEXT,'
+        ' source TEXT,'
+        ' solution TEXT,'
+        ' face_index INTEGER,'
+        ' gender TEXT,'
+        ' age REAL,'
+        ' emotion TEXT,'
+        ' race TEXT)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_created_at ON faces (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_day ON faces (day)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_emotion ON faces (emotion, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_race ON faces (race, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_gender ON faces (gender, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_faces_analysis_key ON faces (analysis_key)',
+    )
+
+    def __init__(self, db_path, flush_interval=0.5, batch_size=500, max_queue=10000):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # 写入
+    def append(self, results, analysis_key=None, source=None, solution=None, created_at=None):
+        """把一次分析的各张人脸结果放进写入队列；队列满时丢弃并计数，不阻塞请求"""
+        self._ensure_writer()
+        created_at = created_at or time.time()
+        day = datetime.fromtimestamp(created_at).strftime('%Y-%m-%d')
+        for i, result in enumerate(results):
+            row = (created_at, day, analysis_key, source, solution, result.get('id', i + 1),
+                   _normalize(result.get('gender')), _to_age(result.get('age')),
+                   _normalize(result.get('emotion')), _normalize(result.get('race')))
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+
+    def _ensure_writer(self):
+        # 线程不会随 fork 复制，子进程第一次写入时重新启动
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.max_queue)
+                threading.Thread(target=self._run, name='results-store-writer', daemon=True).start()
+                self._pid = os.getpid()
+                # 进程退出前写完队列中的结果
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write(rows)
+            except Exception:
+                self.errors += 1
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def _write(self, rows):
+        # 连接为自动提交模式，一批结果显式放在一个事务中写入，出错时整体回滚
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO faces (created_at, day, analysis_key, source, solution, face_index,'
+                ' gender, age, emotion, race) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def flush(self):
+        """阻塞直到队列中的结果全部写入"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    # 查询
+    def _where(self, since=None, until=None, solution=None):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if solution:
+            clauses.append('solution = ?')
+            params.append(solution)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def total(self, since=None, until=None, solution=None):
+        where, params = self._where(since, until, solution)
+        row = self._connect().execute(
+            f'SELECT COUNT(*), COUNT(DISTINCT analysis_key), AVG(age) FROM faces{where}', params
+        ).fetchone()
+        return {'faces': row[0], 'analyses': row[1], 'mean_age': round(row[2], 1) if row[2] is not None else None}
+
+    def counts(self, field, since=None, until=None, solution=None):
+        """按 field 分组计数，按人数从多到少排列"""
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"不支持按 {field} 统计")
+        where, params = self._where(since, until, solution)
+        rows = self._connect().execute(
+            f'SELECT {field}, COUNT(*) AS n FROM faces{where} GROUP BY {field} ORDER BY n DESC', params
+        ).fetchall()
+        counts = {}
+        for value, n in rows:
+            key = value if value is not None else UNKNOWN
+            counts[key] = counts.get(key, 0) + n
+        return counts
+
+    def age_histogram(self, bin_width=10, since=None, until=None, solution=None):
+        """年龄分布，键为各区间的下界；没有年龄的人脸不计入"""
+        where, params = self._where(since, until, solution)
+        where += (' AND ' if where else ' WHERE ') + 'age IS NOT NULL'
+        rows = self._connect().execute(
+            f'SELECT CAST(age / ? AS INTEGER) * ? AS bucket, COUNT(*) FROM faces{where}'
+            ' GROUP BY bucket ORDER BY bucket', [bin_width, bin_width] + params
+        ).fetchall()
+        return {int(bucket): n for bucket, n in rows}
+
+    def timeseries(self, interval, field=None, since=None, until=None, solution=None):
+        """按 interval 秒分桶的人脸数；指定 field 时每个桶再按该字段分组"""
+        if field is not None and field not in GROUP_FIELDS:
+            raise ValueError(f"不支持按 {field} 统计")
+        where, params = self._where(since, until, solution)
+        group = f', {field}' if field else ''
+        rows = self._connect().execute(
+            f'SELECT CAST(created_at / ? AS INTEGER) * ? AS bucket{group}, COUNT(*) FROM faces{where}'
+            f' GROUP BY bucket{group} ORDER BY bucket', [interval, interval] + params
+        ).fetchall()
+        series = {}
+        for row in rows:
+            start = datetime.fromtimestamp(row[0]).isoformat(timespec='seconds')
+            if field:
+                series.setdefault(start, {})[row[1] if row[1] is not None else UNKNOWN] = row[2]
+            else:
+                series[start] = row[1]
+        return [{'start': start, 'count' if not field else field: value} for start, value in series.items()]
+
+    def summary(self, since=None, until=None, solution=None, group_by=('emotion', 'race', 'gender'),
+                age_bin=10, interval=None, interval_field=None):
+        result = {
+            'window': {
+                'since': datetime.fromtimestamp(since).isoformat(timespec='seconds') if since else None,
+                'until': datetime.fromtimestamp(until).isoformat(timespec='seconds') if until else None
+            },
+            'total': self.total(since, until, solution),
+            'counts': {field: self.counts(field, since, until, solution) for field in group_by}
+        }
+        if age_bin:
+            result['age_histogram'] = self.age_histogram(age_bin, since, until, solution)
+        if interval:
+            result['timeseries'] = self.timeseries(interval, interval_field, since, until, solution)
+        return result
+
+
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(value):
+    """'30m'、'24h'、'7d' 这样的时长转换为秒"""
+    match = _DURATION.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"无效的时长：{value}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def parse_time(value):
+    """ISO 时间（如 2026-10-18T08:00:00）或 Unix 时间戳"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def stats_from_args(store, args, now=None):
+    """
+    根据查询参数统计，供 /stats 接口使用：
+    window=24h 或 since/until（ISO 时间或时间戳），solution，group_by=emotion,race，
+    age_bin=10（0 表示不统计年龄），interval=1h 与 interval_field=emotion（按时间分桶）
+    """
+    now = now or time.time()
+    until = parse_time(args['until']) if args.get('until') else None
+    if args.get('since'):
+        since = parse_time(args['since'])
+    elif args.get('window'):
+        since = (until or now) - parse_duration(args['window'])
+    else:
+        since = None
+    group_by = [f.strip() for f in args.get('group_by', 'emotion,race,gender').split(',') if f.strip()]
+    for field in group_by:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"不支持按 {field} 统计")
+    age_bin = int(args.get('age_bin', 10))
+    if age_bin < 0:
+        raise ValueError("age_bin 不能为负数")
+    interval = parse_duration(args['interval']) if args.get('interval') else None
+    return store.summary(since, until, args.get('solution') or None, group_by, age_bin,
+                         interval, args.get('interval_field') or None)
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    value = str(value)
+    # 性别不确定时结果为 "未知(男：..,女：..)"，统计时归为未知
+    return UNKNOWN if value.startswith(UNKNOWN) else value
+
+
+def _to_age(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,109 @@
+# face_core/scheduler.py
+"""微批处理推理调度器：把并发请求中的人脸合并成一批再送入属性模型"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from face_core.attributes import predict_batch
+
+
+class _Job:
+    def __init__(self, faces, actions):
+        self.faces = list(faces)
+        self.actions = list(actions)
+        self.future = Future()
+
+
+class BatchScheduler:
+    """
+    收集各请求提交的人脸，凑满 max_batch_size 张或等待超过 max_wait_ms 毫秒后
+    对每个属性模型只执行一次批量推理，再把结果按人脸分发回各请求
+    """
+
+    def __init__(self, registry, max_batch_size=16, max_wait_ms=10):
+        self.registry = registry
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+
+        # 统计信息
+        self.batches = 0
+        self.faces = 0
+
+        # 所有状态就绪后再启动调度线程
+        self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, faces, actions):
+        """提交一组人脸，返回 Future，结果为与 faces 一一对应的属性字典列表"""
+        job = _Job(faces, actions)
+        if not job.faces:
+            job.future.set_result([])
+        else:
+            self._queue.put(job)
+        return job.future
+
+    def analyze(self, faces, actions, timeout=None):
+        return self.submit(faces, actions).result(timeout)
+
+    def _collect(self):
+        jobs = [self._queue.get()]
+        count = len(jobs[0].faces)
+        deadline = time.perf_counter() + self.max_wait
+
+        while count < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            count += len(job.faces)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            try:
+                self._process(jobs)
+            except Exception as e:
+                if len(jobs) == 1:
+                    jobs[0].future.set_exception(e)
+                    continue
+                # 整批失败时逐个请求重试，只让出错的那个请求失败（例如某张人脸裁剪异常）
+                for job in jobs:
+                    if job.future.done():
+                        continue
+                    try:
+                        self._process([job])
+                    except Exception as job_error:
+                        job.future.set_exception(job_error)
+
+    def _process(self, jobs):
+        self.registry.wait_ready()
+        outputs = [[{} for _ in job.faces] for job in jobs]
+
+        actions = []
+        for job in jobs:
+            actions.extend(a for a in job.actions if a not in actions)
+
+        for action in actions:
+            # 只把请求了该属性的人脸放进这一批
+            owners = [(j, i) for j, job in enumerate(jobs) if action in job.actions
+                      for i in range(len(job.faces))]
+            faces = [jobs[j].faces[i] for j, i in owners]
+            model = self.registry.get(action)
+
+            for start in range(0, len(faces), self.max_batch_size):
+                chunk = faces[start:start + self.max_batch_size]
+                for (j, i), attrs in zip(owners[start:start + self.max_batch_size],
+                                         predict_batch(model, action, chunk)):
+                    outputs[j][i].update(attrs)
+
+        self.batches += 1
+        self.faces += sum(len(job.faces) for job in jobs)
+        for job, result in zip(jobs, outputs):
+            job.future.set_result(result)
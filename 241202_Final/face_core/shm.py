@@ -0,0 +1,50 @@
+# face_core/shm.py
+"""共享内存工具：进程间传递图像数组时不经过 pickle"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def attach_shared_memory(name):
+    """
+    以使用者身份打开已存在的共享内存，只有创建者负责 unlink
+    Python 3.13 之前没有 track 参数；子进程与创建者共用同一个 resource_tracker，
+    重复登记不会造成泄漏告警，因此这里不做额外处理
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArray:
+    """把一个 numpy 数组复制进新建的共享内存，供其他进程零拷贝读取"""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(self.shape, dtype=array.dtype, buffer=self.shm.buf)[...] = array
+
+    @property
+    def descriptor(self):
+        """传给其他进程的描述信息 (名称, 形状, 数据类型)"""
+        return self.shm.name, self.shape, self.dtype
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def open_shared_array(descriptor):
+    """根据描述信息打开共享数组，返回 (共享内存, 数组视图)；用完后需先删除视图再 close"""
+    name, shape, dtype = descriptor
+    shm = attach_shared_memory(name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
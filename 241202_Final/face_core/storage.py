@@ -0,0 +1,376 @@
+# face_core/storage.py
+"""
+按日期分区的文件存储与过期清理
+上传文件和结果文件保存在 <root>/YYYY/MM/DD/<散列子目录>/ 下，文件名使用 ULID，并发请求不会互相覆盖
+每个文件连同过期时间、大小、内容哈希登记到 SQLite 索引
+清理时先按索引逐批删除已过期的文件（只查询索引，不扫描目录），再整体删除超过保留期的日期分区
+删除分批进行并限制速率，避免清理任务占满磁盘 I/O
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from face_core.writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+PARTITION_FORMAT = '%Y/%m/%d'
+_CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+
+def new_key(timestamp=None):
+    """ULID：48 位毫秒时间戳 + 80 位随机数，编码为 26 个字符，按生成时间排序且不会重复"""
+    value = (int((timestamp or time.time()) * 1000) << 80) | int.from_bytes(os.urandom(10), 'big')
+    chars = []
+    for _ in range(26):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def partition_name(when=None):
+    """返回日期分区的相对路径，例如 2026/10/18"""
+    return (when or datetime.now()).strftime(PARTITION_FORMAT)
+
+
+def partition_path(root, when=None):
+    """返回 root 下的日期分区目录，不存在时创建"""
+    path = os.path.join(root, *partition_name(when).split('/'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def iter_partitions(root):
+    """按日期升序返回 (date, 分区目录)；只列出年、月、日三层目录，不访问其中的文件"""
+    def numeric_dirs(path):
+        try:
+            return sorted(e.name for e in os.scandir(path) if e.is_dir() and e.name.isdigit())
+        except FileNotFoundError:
+            return []
+
+    for year in numeric_dirs(root):
+        for month in numeric_dirs(os.path.join(root, year)):
+            for day in numeric_dirs(os.path.join(root, year, month)):
+                try:
+                    yield date(int(year), int(month), int(day)), os.path.join(root, year, month, day)
+                except ValueError:
+                    continue
+
+
+class ArtifactIndex:
+    """
+    产物索引：记录每个文件所在的日期分区和过期时间
+    Web 进程和 worker 进程共用同一个数据库文件（WAL 模式），每个线程使用自己的连接
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS artifacts ('
+        ' path TEXT PRIMARY KEY,'
+        ' partition TEXT NOT NULL,'
+        ' created_at REAL NOT NULL,'
+        ' expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_artifacts_expires_at ON artifacts (expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_artifacts_partition ON artifacts (partition)',
+    )
+    # 元数据列；旧版本创建的数据库在连接时补上
+    COLUMNS = {'key': 'TEXT', 'kind': 'TEXT', 'size': 'INTEGER', 'sha256': 'TEXT'}
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(artifacts)')}
+            for column, column_type in self.COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE artifacts ADD COLUMN {column} {column_type}')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_key ON artifacts (key)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # 连接为自动提交模式，批量修改显式放在一个事务中，出错时整体回滚
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def add(self, entries, ttl, created_at=None):
+        """
+        在一个事务中登记多个文件，ttl 为保留秒数
+        entries 为路径，或 {'path': ..., 'key': ..., 'kind': ..., 'size': ..., 'sha256': ...}，除 path 外均可省略
+        """
+        created_at = created_at or time.time()
+        partition = partition_name(datetime.fromtimestamp(created_at))
+        rows = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'path': entry}
+            rows.append((entry['path'], partition, created_at, created_at + ttl, entry.get('key'),
+                         entry.get('kind'), entry.get('size'), entry.get('sha256')))
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO artifacts (path, partition, created_at, expires_at, key, kind, size, sha256)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+
+    def lookup(self, key):
+        """返回某个 key 下登记的全部文件"""
+        conn = self._connect()
+        cursor = conn.execute(
+            'SELECT path, kind, size, sha256, created_at, expires_at FROM artifacts WHERE key = ?', (key,)
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def contains(self, path):
+        """文件是否已登记（登记时文件可能仍在后台写入）"""
+        return self._connect().execute('SELECT 1 FROM artifacts WHERE path = ?', (path,)).fetchone() is not None
+
+    def due(self, now=None, limit=500):
+        """返回已过期的文件路径，按过期时间排序，最多 limit 个"""
+        rows = self._connect().execute(
+            'SELECT path FROM artifacts WHERE expires_at <= ? ORDER BY expires_at LIMIT ?',
+            (now or time.time(), limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, paths):
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM artifacts WHERE path = ?', [(path,) for path in paths])
+
+    def drop_partition(self, partition):
+        """删除某个日期分区的全部登记，返回删除的条数"""
+        with self._transaction() as conn:
+            return conn.execute('DELETE FROM artifacts WHERE partition = ?', (partition,)).rowcount
+
+    def count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM artifacts').fetchone()[0]
+
+
+class ArtifactStore:
+    """
+    按 key 存放文件：<root>/YYYY/MM/DD/<key 末尾 fanout 个字符>/<文件名>
+    ULID 的末尾是随机部分，同一天的文件均匀分散到最多 32^fanout 个子目录中，单个目录不会过大
+    index 为空时只负责路径和原子写入，不登记
+    """
+
+    def __init__(self, root, index=None, ttl=24 * 3600, fanout=2):
+        self.root = root
+        self.index = index
+        self.ttl = ttl
+        self.fanout = fanout
+
+    def path_for(self, key, filename, when=None):
+        """返回文件路径并创建所在目录"""
+        directory = os.path.join(partition_path(self.root, when), key[-self.fanout:])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def relpath(self, path):
+        """相对 root 的路径，以 / 分隔，用于 URL"""
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def write(self, key, filename, data, kind=None):
+        """原子写入字节串，返回待登记的条目（含大小和内容哈希）；多个文件可以写完后一次登记"""
+        path = self.path_for(key, filename)
+        write_atomic(path, data)
+        return entry(path, key, kind, data)
+
+    def put(self, key, filename, data, kind=None):
+        """写入并登记，返回文件路径"""
+        item = self.write(key, filename, data, kind)
+        self.register([item])
+        return item['path']
+
+    def register(self, entries):
+        """登记文件，包括由其他途径（后台写入线程、上传保存）写入的文件"""
+        if self.index is not None:
+            self.index.add(entries, self.ttl)
+
+
+def entry(path, key=None, kind=None, data=None):
+    """索引条目；给出 data 时记录大小和内容哈希"""
+    item = {'path': path, 'key': key, 'kind': kind}
+    if data is not None:
+        item.update(size=len(data), sha256=content_key(data))
+    return item
+
+
+class RateLimiter:
+    """限制每秒处理的文件数"""
+
+    def __init__(self, max_rate):
+        self.max_rate = max_rate
+        self._start = time.monotonic()
+        self._count = 0
+
+    def throttle(self, count):
+        if not self.max_rate:
+            return
+        self._count += count
+        ahead = self._count / self.max_rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class ExpiryCleaner:
+    """
+    清理过期文件，每次运行的步骤：
+    1. 按索引删除已过期的文件，每批 batch_size 个
+    2. 删除早于保留期的整个日期分区（包括未登记的文件）以及对应的索引记录
+    3. 根目录下分区之前遗留的平铺文件按修改时间清理；根目录没有变化且已没有平铺文件时跳过，不再每次扫描
+    max_rate 为每秒最多删除的文件数，max_per_run 为单次运行最多删除的文件数（None 表示不限）
+    删除失败（如权限不足、文件被占用）的文件只记录日志并计入 failed，不会让清理卡在同一批文件上
+    """
+
+    # 根目录 -> 最近一次确认没有平铺文件时的目录修改时间（本进程内有效）
+    _legacy_clean = {}
+
+    def __init__(self, roots, index, retention=timedelta(hours=24), batch_size=500, max_rate=2000,
+                 max_per_run=None):
+        self.roots = list(roots)
+        self.index = index
+        self.retention = retention
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.max_per_run = max_per_run
+
+    def run(self, now=None):
+        now = now or datetime.now()
+        limiter = RateLimiter(self.max_rate)
+        stats = {'expired': 0, 'partitions': 0, 'partition_files': 0, 'legacy': 0, 'failed': 0}
+
+        # 1. 索引中已过期的文件；删除失败的也移出索引，留在磁盘上的文件随所在日期分区一起删除
+        while not self._budget_spent(stats):
+            paths = self.index.due(now.timestamp(), self.batch_size)
+            if not paths:
+                break
+            self._remove_batch(paths, limiter, stats)
+            self.index.remove(paths)
+            stats['expired'] += len(paths)
+
+        # 2. 超过保留期的日期分区：分区日期早于 (now - retention) 所在的那一天，其中的文件都已超过保留期
+        cutoff = (now - self.retention).date()
+        for root in self.roots:
+            dropped = False
+            for day, path in iter_partitions(root):
+                if day >= cutoff or self._budget_spent(stats):
+                    break
+                if self._drop_tree(path, limiter, stats):
+                    stats['partitions'] += 1
+                    dropped = True
+                    self.index.drop_partition(day.strftime(PARTITION_FORMAT))
+            # 只有删除了分区，月、年目录才可能变空
+            if dropped:
+                self._prune_empty(root, cutoff)
+
+        # 3. 平铺在根目录下的旧文件
+        threshold = (now - self.retention).timestamp()
+        for root in self.roots:
+            if not self._budget_spent(stats):
+                self._sweep_legacy(root, threshold, limiter, stats)
+
+        return stats
+
+    def _budget_spent(self, stats):
+        if self.max_per_run is None:
+            return False
+        return stats['expired'] + stats['partition_files'] + stats['legacy'] >= self.max_per_run
+
+    def _remove_batch(self, paths, limiter, stats):
+        stats['failed'] += sum(1 for path in paths if not _remove(path))
+        limiter.throttle(len(paths))
+        return len(paths)
+
+    def _sweep_legacy(self, root, threshold, limiter, stats):
+        try:
+            mtime = os.stat(root).st_mtime
+        except FileNotFoundError:
+            return
+        if self._legacy_clean.get(root) == mtime:
+            return
+
+        remaining, batch = 0, []
+        for entry in os.scandir(root):
+            if not entry.is_file():
+                continue
+            if self._budget_spent(stats) or entry.stat().st_mtime >= threshold:
+                remaining += 1
+                continue
+            batch.append(entry.path)
+            if len(batch) >= self.batch_size:
+                stats['legacy'] += self._remove_batch(batch, limiter, stats)
+                batch = []
+        stats['legacy'] += self._remove_batch(batch, limiter, stats)
+
+        # 平铺文件都已删除时记下目录修改时间，之后根目录没有新增文件就不再扫描
+        if not remaining and not any(entry.is_file() for entry in os.scandir(root)):
+            self._legacy_clean[root] = os.stat(root).st_mtime
+
+    def _drop_tree(self, path, limiter, stats):
+        """分批删除目录下的文件后删除目录，返回是否已全部删除（达到单次上限时中途停止）"""
+        for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+            for start in range(0, len(filenames), self.batch_size):
+                if self._budget_spent(stats):
+                    return False
+                stats['partition_files'] += self._remove_batch(
+                    [os.path.join(dirpath, name) for name in filenames[start:start + self.batch_size]],
+                    limiter, stats
+                )
+            _rmdir(dirpath)
+        return not os.path.exists(path)
+
+    def _prune_empty(self, root, cutoff):
+        # 删除 cutoff 所在月份之前已经空了的月、年目录；当月目录可能正在被写入，不动
+        for year in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            year_path = os.path.join(root, year)
+            if not (year.isdigit() and os.path.isdir(year_path)) or int(year) > cutoff.year:
+                continue
+            for month in os.listdir(year_path):
+                if month.isdigit() and (int(year), int(month)) < (cutoff.year, cutoff.month):
+                    _rmdir(os.path.join(year_path, month))
+            if int(year) < cutoff.year:
+                _rmdir(year_path)
+
+
+def _remove(path):
+    """删除文件，返回是否成功（文件已不存在也算成功）"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to remove {path}: {e}")
+        return False
+    return True
+
+
+def _rmdir(path):
+    # 只删除空目录
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
@@ -0,0 +1,187 @@
+# face_core/taskqueue.py
+"""
+进程内任务队列：用线程池代替 Celery + Redis，接口与 Celery 任务的常用部分一致
+    task = queue.task(bind=True, name='app.x')(func)
+    result = task.delay(...)              # result.id
+    task.AsyncResult(task_id).state       # PENDING / STARTED / PROGRESS / SUCCESS / FAILURE
+    self.update_state(state='PROGRESS', meta={...})  # 绑定任务内上报进度
+单机部署和测试时不需要 broker，提交任务也没有网络往返
+任务结果只保存在本进程内存中，进程重启后丢失；按完成顺序保留最近 max_results 个
+on_finish 注册的回调在结果保存之后调用，对应 Celery 的 task_success / task_failure 信号
+"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRequest:
+    def __init__(self, task_id):
+        self.id = task_id
+
+
+class TaskContext:
+    """绑定任务（bind=True）的第一个参数，提供 request.id 和 update_state"""
+
+    def __init__(self, task, task_id):
+        self.task = task
+        self.name = task.name
+        self.request = TaskRequest(task_id)
+
+    def update_state(self, state=None, meta=None):
+        self.task.queue._set_state(self.request.id, state, meta)
+
+
+class LocalAsyncResult:
+    def __init__(self, queue, task_id):
+        self.queue = queue
+        self.id = task_id
+
+    @property
+    def state(self):
+        return self.queue._get_state(self.id)[0]
+
+    status = state
+
+    @property
+    def info(self):
+        return self.queue._get_state(self.id)[1]
+
+    @property
+    def result(self):
+        return self.info
+
+    def ready(self):
+        return self.state in ('SUCCESS', 'FAILURE')
+
+    def successful(self):
+        return self.state == 'SUCCESS'
+
+    def get(self, timeout=None):
+        """等待任务完成并返回结果；任务抛出的异常原样抛出，未知或已淘汰的任务抛出 KeyError"""
+        event = self.queue._done_event(self.id)
+        if event is None:
+            # 从未提交或结果已被淘汰，没有可等待的结果
+            raise KeyError(f"未知的任务 {self.id}（未提交或结果已过期）")
+        if not event.wait(timeout):
+            raise TimeoutError(f"任务 {self.id} 未在 {timeout} 秒内完成")
+        state, info = self.queue._get_state(self.id)
+        if state == 'FAILURE':
+            raise info
+        return info
+
+
+class LocalTask:
+    def __init__(self, queue, func, name, bind=False):
+        self.queue = queue
+        self.func = func
+        self.name = name
+        self.bind = bind
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args=(), kwargs=None, task_id=None):
+        task_id = task_id or str(uuid.uuid4())
+        self.queue._submit(self, task_id, tuple(args), dict(kwargs or {}))
+        return LocalAsyncResult(self.queue, task_id)
+
+    def AsyncResult(self, task_id):
+        return LocalAsyncResult(self.queue, task_id)
+
+
+class LocalTaskQueue:
+    """线程池任务队列；模型在进程内只加载一次，由各工作线程共享"""
+
+    def __init__(self, workers=2, max_results=1024):
+        self.workers = workers
+        self.max_results = max_results
+        self.tasks = {}
+        self._finish_callbacks = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='local-task')
+        # task_id -> [state, info, 完成事件]
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def task(self, bind=False, name=None):
+        def decorator(func):
+            task = LocalTask(self, func, name or func.__name__, bind)
+            self.tasks[task.name] = task
+            return task
+
+        return decorator
+
+    def on_finish(self, callback):
+        """注册任务完成回调 callback(task, task_id, state, info)；此时 AsyncResult 已能查到最终状态"""
+        self._finish_callbacks.append(callback)
+        return callback
+
+    def _submit(self, task, task_id, args, kwargs):
+        with self._lock:
+            self._states[task_id] = ['PENDING', None, threading.Event()]
+        self._executor.submit(self._run, task, task_id, args, kwargs)
+
+    def _run(self, task, task_id, args, kwargs):
+        self._set_state(task_id, 'STARTED', None)
+        try:
+            if task.bind:
+                result = task.func(TaskContext(task, task_id), *args, **kwargs)
+            else:
+                result = task.func(*args, **kwargs)
+        except Exception as e:
+            state, info = 'FAILURE', e
+        else:
+            state, info = 'SUCCESS', result
+        self._finish(task_id, state, info)
+        for callback in self._finish_callbacks:
+            # 回调在线程池中执行，异常不会传到任何地方，这里记录下来
+            try:
+                callback(task, task_id, state, info)
+            except Exception:
+                logger.exception(f"Task finish callback failed: {task.name} {task_id}")
+
+    def _set_state(self, task_id, state, meta):
+        with self._lock:
+            entry = self._states.get(task_id)
+            if entry is not None:
+                entry[0], entry[1] = state, meta
+
+    def _finish(self, task_id, state, info):
+        with self._lock:
+            entry = self._states.get(task_id)
+            if entry is None:
+                return
+            entry[0], entry[1] = state, info
+            entry[2].set()
+            # 已完成的任务移到末尾，超出上限时从最早完成的开始淘汰；未完成的任务不淘汰，但也不会挡住其后已完成的
+            self._states.move_to_end(task_id)
+            excess = len(self._states) - self.max_results
+            if excess > 0:
+                evict = []
+                for other_id, other in self._states.items():
+                    if other[2].is_set():
+                        evict.append(other_id)
+                        if len(evict) >= excess:
+                            break
+                for other_id in evict:
+                    del self._states[other_id]
+
+    def _get_state(self, task_id):
+        # 未知的 task_id 与 Celery 一样视为 PENDING
+        with self._lock:
+            entry = self._states.get(task_id)
+            return (entry[0], entry[1]) if entry is not None else ('PENDING', None)
+
+    def _done_event(self, task_id):
+        with self._lock:
+            entry = self._states.get(task_id)
+            return entry[2] if entry is not None else None
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,151 @@
+# face_core/tracker.py
+"""
+跨帧人脸跟踪：用 IoU 把相邻帧的检测结果关联成轨迹并分配稳定 ID
+年龄、性别、种族对同一个人基本不变，因此每条轨迹只需每隔 N 帧或外观明显变化时重新推理
+"""
+import threading
+
+import cv2
+import numpy as np
+
+from face_core.pipeline import detect_faces, analyze_faces
+from face_core.preprocess import MAX_DETECT_SIDE
+
+THUMB_SIZE = (16, 16)
+
+
+def iou(a, b):
+    """两个 {'x','y','w','h'} 区域的交并比"""
+    x1, y1 = max(a['x'], b['x']), max(a['y'], b['y'])
+    x2 = min(a['x'] + a['w'], b['x'] + b['w'])
+    y2 = min(a['y'] + a['h'], b['y'] + b['h'])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a['w'] * a['h'] + b['w'] * b['h'] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _thumbnail(face):
+    """用于比较外观变化的小尺寸灰度图"""
+    gray = cv2.cvtColor(np.asarray(face, dtype=np.float32), cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class Track:
+    def __init__(self, track_id, region):
+        self.id = track_id
+        self.region = region
+        self.attributes = {}
+        self.age = 0              # 距上次推理经过的帧数
+        self.missed = 0           # 连续未匹配的帧数
+        self.thumbnail = None     # 上次推理时的外观
+
+
+class FaceTracker:
+    """基于 IoU 贪心匹配的轻量跟踪器"""
+
+    def __init__(self, iou_threshold=0.3, refresh_interval=15, max_missed=10, appearance_threshold=0.12):
+        self.iou_threshold = iou_threshold
+        self.refresh_interval = refresh_interval
+        self.max_missed = max_missed
+        self.appearance_threshold = appearance_threshold
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections):
+        """返回与 detections 一一对应的轨迹"""
+        pairs = sorted(
+            ((iou(track.region, det['region']), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, det in enumerate(detections)),
+            reverse=True
+        )
+
+        matched_tracks, assigned = set(), {}
+        for score, t, d in pairs:
+            if score < self.iou_threshold:
+                break
+            if t in matched_tracks or d in assigned:
+                continue
+            matched_tracks.add(t)
+            assigned[d] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+
+        result = []
+        for d, det in enumerate(detections):
+            track = assigned.get(d)
+            if track is None:
+                track = Track(self._next_id, det['region'])
+                self._next_id += 1
+                self.tracks.append(track)
+            track.region = det['region']
+            track.missed = 0
+            track.age += 1
+            result.append(track)
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return result
+
+    def needs_refresh(self, track, detection, actions):
+        """判断该轨迹是否需要重新运行属性模型"""
+        if track.thumbnail is None or track.age >= self.refresh_interval:
+            return True
+        if any(action not in track.attributes for action in actions):
+            return True
+        diff = np.mean(np.abs(_thumbnail(detection['face']) - track.thumbnail))
+        return diff > self.appearance_threshold
+
+    def store(self, track, detection, attributes):
+        track.attributes.update(attributes)
+        track.thumbnail = _thumbnail(detection['face'])
+        track.age = 0
+
+
+# 结果字典中各检测选项对应的字段
+ACTION_KEYS = {
+    'age': ('age',),
+    'gender': ('gender', 'dominant_gender'),
+    'emotion': ('emotion', 'dominant_emotion'),
+    'race': ('race', 'dominant_race')
+}
+
+
+class TrackedAnalyzer:
+    """
+    带跟踪的分析器，可直接作为 InferenceWorker 的 analyze 参数
+    每帧都做检测，只对需要刷新的轨迹运行属性模型，其余轨迹沿用缓存的属性
+    """
+
+    def __init__(self, tracker=None, registry=None, scheduler=None, max_side=MAX_DETECT_SIDE):
+        self.tracker = tracker or FaceTracker()
+        self.registry = registry
+        self.scheduler = scheduler
+        self.max_side = max_side  # 检测输入的最长边上限
+        self.inferred = 0  # 实际推理的人脸数
+        self.reused = 0    # 复用轨迹属性的人脸数
+        self._lock = threading.Lock()
+
+    def __call__(self, frame, actions):
+        detections = detect_faces(frame, registry=self.registry, max_side=self.max_side)
+
+        with self._lock:
+            tracks = self.tracker.update(detections)
+            stale = [i for i, (track, det) in enumerate(zip(tracks, detections))
+                     if self.tracker.needs_refresh(track, det, actions)]
+
+            if stale:
+                fresh = analyze_faces([detections[i] for i in stale], actions, self.registry, self.scheduler)
+                for i, attributes in zip(stale, fresh):
+                    self.tracker.store(tracks[i], detections[i], attributes)
+            self.inferred += len(stale)
+            self.reused += len(detections) - len(stale)
+
+            analysis = []
+            for track, det in zip(tracks, detections):
+                face = {key: track.attributes[key] for action in actions
+                        for key in ACTION_KEYS[action] if key in track.attributes}
+                face.update(region=det['region'], face_confidence=det['confidence'], track_id=track.id)
+                analysis.append(face)
+        return analysis
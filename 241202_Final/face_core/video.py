@@ -0,0 +1,147 @@
+# face_core/video.py
+"""视频文件 / 视频流分析：后台线程解码并抽帧，结果逐帧流式返回"""
+import json
+import queue
+import threading
+import time
+
+import cv2
+
+from face_core.pipeline import analyze_image
+
+_END = object()
+
+
+class FrameReader(threading.Thread):
+    """
+    后台读帧线程，按 sample_fps 抽帧后放入有界队列
+    视频文件队列满时等待（不丢帧）；实时流队列满时丢弃最旧的帧，保证内存占用恒定
+    """
+
+    def __init__(self, source, sample_fps=1.0, max_frames=None, queue_size=8, live=False):
+        super().__init__(name='video-reader', daemon=True)
+        self.source = source
+        self.sample_fps = sample_fps
+        self.max_frames = max_frames
+        self.live = live
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.read_count = 0
+        self.dropped = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self.live:
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"无法打开视频: {self.source}")
+
+            source_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+            # 视频文件按帧号抽样，帧率未知的实时流按时间抽样
+            step = max(1, round(source_fps / self.sample_fps)) if source_fps > 0 and not self.live else None
+            interval = 1.0 / self.sample_fps if self.sample_fps > 0 else 0
+            last_sample = None
+            sampled = 0
+            index = -1
+
+            while not self._stop_event.is_set():
+                if step is not None and index >= 0 and step > 1:
+                    # 跳过不需要的帧时只 grab 不解码
+                    skipped = True
+                    for _ in range(step - 1):
+                        if not cap.grab():
+                            skipped = False
+                            break
+                        index += 1
+                    if not skipped:
+                        break
+
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                index += 1
+                self.read_count += 1
+
+                if step is None:
+                    now = time.monotonic()
+                    if last_sample is not None and now - last_sample < interval:
+                        continue
+                    last_sample = now
+                    position = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                else:
+                    position = index / source_fps
+
+                self._put((index, round(position, 3), frame))
+                sampled += 1
+                if self.max_frames and sampled >= self.max_frames:
+                    break
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            cap.release()
+            self._put(_END)
+
+
+def iter_video_results(source, actions, sample_fps=1.0, max_frames=None, live=False,
+                       registry=None, scheduler=None, formatter=None, analyzer=None):
+    """
+    逐帧产出分析结果（生成器），不在内存中保留历史帧或结果
+    formatter(analysis) 用于把原始分析结果转换成接口需要的格式
+    analyzer(frame, actions) 可替换默认的逐帧分析，例如带跟踪的 TrackedAnalyzer
+    """
+    if analyzer is None:
+        analyzer = lambda frame, actions: analyze_image(frame, actions, registry, scheduler)
+
+    reader = FrameReader(source, sample_fps, max_frames, live=live)
+    reader.start()
+    processed = 0
+    try:
+        while True:
+            item = reader.frames.get()
+            if item is _END:
+                break
+            index, position, frame = item
+            analysis = analyzer(frame, actions)
+            processed += 1
+            yield {
+                'frame': index,
+                'time': position,
+                'faces': formatter(analysis) if formatter else analysis
+            }
+
+        summary = {'done': True, 'frames_analyzed': processed, 'frames_decoded': reader.read_count,
+                   'frames_dropped': reader.dropped}
+        if reader.error:
+            summary['error'] = reader.error
+        yield summary
+    finally:
+        reader.stop()
+
+
+def to_ndjson(events):
+    """每个事件一行 JSON"""
+    for event in events:
+        yield json.dumps(event, ensure_ascii=False, default=float) + '\n'
+
+
+def to_sse(events):
+    """Server-Sent Events 格式"""
+    for event in events:
+        name = 'done' if event.get('done') else 'frame'
+        yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False, default=float)}\n\n"
@@ -0,0 +1,151 @@
+# face_core/writer.py
+"""后台写结果文件：请求先返回 JSON，结果图片和 CSV 由写入线程异步落盘"""
+import atexit
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+
+def write_atomic(path, data):
+    """先写临时文件再重命名，其他进程看到的文件总是完整的"""
+    # 临时文件名带上进程号和线程号：线程号只在本进程内唯一，多个 worker 进程可能同时写同一个文件
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def encode_csv(rows, fieldnames=None):
+    """把结果列表编码为带 BOM 的 UTF-8 CSV（与 DataFrame.to_csv(encoding='utf-8-sig') 一致）"""
+    if fieldnames is None:
+        fieldnames = list(rows[0].keys()) if rows else []
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore', lineterminator='\n')
+    if fieldnames:
+        writer.writeheader()
+        writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def encode_image(frame, ext='.jpg', quality=95):
+    # 只在编码图片时导入 cv2，只写 CSV/字节的进程不必加载它
+    import cv2
+
+    ok, buffer = cv2.imencode(ext, frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise IOError("图片编码失败")
+    return buffer.tobytes()
+
+
+class ArtifactWriter:
+    """带队列的后台写入器，记录尚未落盘的文件以便下载时等待"""
+
+    def __init__(self, workers=1, max_queue=256):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.errors = 0
+        self.pid = os.getpid()
+        # 每次写入完成后调用 observer(path, 耗时秒数)，用于记录写入耗时
+        self.observer = None
+        self._threads = [
+            threading.Thread(target=self._run, name=f'artifact-writer-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _submit(self, path, encode):
+        event = threading.Event()
+        with self._lock:
+            self._pending[path] = event
+        # 队列满时阻塞请求线程，起到背压作用
+        self._queue.put((path, encode, event))
+        return path
+
+    def write_image(self, path, frame, quality=95):
+        """异步保存图片；frame 会被复制，调用方之后可以继续修改原数组"""
+        frame = frame.copy()
+        return self._submit(path, lambda: encode_image(frame, os.path.splitext(path)[1] or '.jpg', quality))
+
+    def write_bytes(self, path, data):
+        return self._submit(path, lambda: data)
+
+    def write_csv(self, path, rows, fieldnames=None):
+        rows = [dict(row) for row in rows]
+        return self._submit(path, lambda: encode_csv(rows, fieldnames))
+
+    def _run(self):
+        while True:
+            path, encode, event = self._queue.get()
+            try:
+                start = time.perf_counter()
+                write_atomic(path, encode())
+                if self.observer is not None:
+                    self.observer(path, time.perf_counter() - start)
+            except Exception:
+                self.errors += 1
+            finally:
+                with self._lock:
+                    if self._pending.get(path) is event:
+                        del self._pending[path]
+                event.set()
+                self._queue.task_done()
+
+    def is_pending(self, path):
+        with self._lock:
+            return path in self._pending
+
+    def wait(self, path, timeout=10):
+        """
+        等待文件写完，返回文件是否存在
+        本进程提交的写入直接等待完成事件；其他进程（如 Celery worker）写的文件轮询检查
+        """
+        with self._lock:
+            event = self._pending.get(path)
+        if event is not None:
+            event.wait(timeout)
+            return os.path.exists(path)
+        return wait_for_file(path, timeout)
+
+    def flush(self):
+        """阻塞直到队列中的写入全部完成"""
+        self._queue.join()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer(workers=1):
+    """返回当前进程唯一的写入器（线程不会随 fork 复制，子进程会重新创建）"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = ArtifactWriter(workers)
+            # 进程退出前把尚未落盘的结果写完
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def wait_for_file(path, timeout=10, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True